@@ -0,0 +1,93 @@
+"""
+Пространства имён в общем кэше.
+
+Ключи каждого пространства получают префикс с его именем и токеном
+версии, который хранится в том же общем кэше. Смена токена одним
+воркером сбрасывает всё пространство сразу для всех процессов.
+"""
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from core import metrics
+
+MISSING = object()
+
+
+def new_token():
+    return uuid.uuid4().hex[:12]
+
+
+class Namespace:
+    """Набор ключей общего кэша с общим префиксом и версией."""
+
+    def __init__(self, name, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.alias = alias
+
+    def __repr__(self):
+        return f'<Namespace {self.name}>'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def version_key(self):
+        return f'ns:{self.name}'
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, new_token(), None)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        """Сбрасывает все ключи пространства."""
+        self.cache.set(self.version_key, new_token(), None)
+
+    def make_key(self, key, version=None):
+        return f'{self.name}:{version or self.version()}:{key}'
+
+    def get(self, key, default=None):
+        value = self.cache.get(self.make_key(key), MISSING)
+        if value is MISSING:
+            metrics.record_cache(misses=1)
+            return default
+        metrics.record_cache(hits=1)
+        return value
+
+    def get_many(self, keys):
+        version = self.version()
+        keys = {self.make_key(key, version): key for key in keys}
+        found = self.cache.get_many(list(keys))
+        metrics.record_cache(hits=len(found), misses=len(keys) - len(found))
+        return {keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(self.make_key(key), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT):
+        version = self.version()
+        self.cache.set_many(
+            {
+                self.make_key(key, version): value
+                for key, value in data.items()
+            },
+            timeout,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(self.make_key(key), value, timeout)
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT):
+        return self.cache.get_or_set(self.make_key(key), default, timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def delete_many(self, keys):
+        version = self.version()
+        self.cache.delete_many([self.make_key(key, version) for key in keys])
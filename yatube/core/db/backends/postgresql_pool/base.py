@@ -0,0 +1,55 @@
+"""
+PostgreSQL с пулом соединений внутри процесса.
+
+Соединения берутся из psycopg2.pool.ThreadedConnectionPool, а при
+закрытии возвращаются в пул, поэтому CONN_MAX_AGE для этого бэкенда
+ставится в 0: соединение отдаётся пулу в конце каждого запроса.
+Размер пула задают OPTIONS['min_connections'] и
+OPTIONS['max_connections'].
+"""
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+POOL_OPTIONS = ('min_connections', 'max_connections')
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in POOL_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_pool(self, conn_params):
+        with _lock:
+            if self.alias not in _pools:
+                options = self.settings_dict['OPTIONS']
+                _pools[self.alias] = pool.ThreadedConnectionPool(
+                    options.get('min_connections', 1),
+                    options.get('max_connections', 10),
+                    **conn_params,
+                )
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            # Незавершённую транзакцию пул откатит сам.
+            _pools[self.alias].putconn(self.connection)
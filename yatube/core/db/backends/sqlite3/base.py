@@ -0,0 +1,25 @@
+"""
+SQLite с настройкой соединения через PRAGMA.
+
+OPTIONS['pragmas'] - словарь PRAGMA, которые выполняются на каждом
+новом соединении: журнал WAL не блокирует чтение во время записи,
+synchronous=NORMAL в режиме WAL сбрасывает данные на диск только на
+контрольных точках, busy_timeout заставляет писателей ждать блокировку,
+а не сразу падать с "database is locked".
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
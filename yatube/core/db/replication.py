@@ -0,0 +1,30 @@
+"""
+Замена репликации для локальной проверки.
+
+sync_replicas() копирует файл основной БД SQLite в файлы реплик через
+backup API sqlite3: до следующей копии реплики отстают от default так
+же, как отставали бы настоящие реплики.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+def sync_replicas(aliases=None):
+    """Копирует default во все реплики. Возвращает их псевдонимы."""
+    primary = settings.DATABASES['default']
+    if primary['ENGINE'] != 'core.db.backends.sqlite3':
+        raise ImproperlyConfigured('Копировать реплики можно только в SQLite.')
+    aliases = list(aliases or settings.DATABASE_REPLICAS)
+    source = sqlite3.connect(primary['NAME'])
+    try:
+        for alias in aliases:
+            target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    return aliases
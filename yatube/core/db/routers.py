@@ -0,0 +1,118 @@
+"""
+Чтение с реплик.
+
+Представления, обёрнутые в read_replica, читают данные с одной из
+реплик settings.DATABASE_REPLICAS ({псевдоним: вес}); реплика
+выбирается на весь запрос по кругу или случайно с учётом весов
+(REPLICA_SELECTION). Запись и остальные представления работают с default.
+
+Реплика может отставать, поэтому после запроса с записью
+ReplicaMiddleware ставит cookie REPLICA_PIN_COOKIE: пока она жива,
+запросы этого пользователя читают из default и видят свои изменения.
+"""
+import itertools
+import random
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+# Сессии всегда читаются из default: новая сессия может ещё не дойти
+# до реплики.
+PRIMARY_APPS = {'sessions'}
+
+current = ContextVar('replica_state', default=None)
+
+
+class RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+@lru_cache(maxsize=None)
+def _cycle(aliases):
+    return itertools.cycle(aliases)
+
+
+def choose_replica():
+    """Псевдоним реплики для запроса или None, если реплик нет."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return None
+    if settings.REPLICA_SELECTION == 'weighted':
+        return random.choices(
+            list(replicas), weights=list(replicas.values())
+        )[0]
+    return next(_cycle(tuple(replicas)))
+
+
+def current_replica():
+    """Реплика, с которой читает текущий запрос, или None."""
+    state = current.get()
+    return state.replica if state is not None else None
+
+
+def read_replica(view):
+    """Представление читает с реплики, если пользователь не закреплён."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = current.get()
+        if state is None or state.pinned:
+            return view(request, *args, **kwargs)
+        state.replica = choose_replica()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica = None
+    return wrapper
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        state = current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RequestState(
+            pinned=settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        token = current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
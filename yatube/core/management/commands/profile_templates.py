@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core import metrics
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько раз за запрос отрисовывается каждый шаблон '
+        'и сколько времени он занимает.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='*', default=['/'],
+            help='Адреса страниц, по умолчанию главная.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--user',
+            default=None,
+            help='Открывать страницы от имени этого пользователя.',
+        )
+        parser.add_argument('--top', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1')
+        client = Client()
+        if options['user']:
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+        metrics.install_template_profiler()
+        # Страница из кэша не отрисовывается, замерять было бы нечего.
+        with override_settings(PAGE_CACHE=False):
+            for url in options['urls']:
+                client.get(url)
+                profile = metrics.TemplateProfile()
+                token = metrics.template_profile.set(profile)
+                try:
+                    for _ in range(options['repeat']):
+                        response = client.get(url)
+                finally:
+                    metrics.template_profile.reset(token)
+                self.stdout.write(f'{url} ({response.status_code})')
+                for row in profile.as_list(options['top'], options['repeat']):
+                    self.stdout.write(
+                        f'  {row["template"]:<40} '
+                        f'{row["calls"]:>8g} раз '
+                        f'всего {row["total_ms"]:>9.3f} мс '
+                        f'своё {row["own_ms"]:>9.3f} мс'
+                    )
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.db.replication import sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную БД SQLite в файлы реплик.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=None,
+            help='Повторять копирование раз в столько секунд.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            aliases = sync_replicas()
+            self.stdout.write(f'Скопировано в: {", ".join(aliases)}')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
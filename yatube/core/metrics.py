@@ -0,0 +1,267 @@
+"""
+Метрики одного запроса.
+
+RequestMetricsMiddleware заводит на время запроса RequestMetrics
+в contextvar и оборачивает соединения с БД через execute_wrapper.
+Шаблоны (бэкенд DjangoTemplates из этого модуля), пространства имён
+кэша и миниатюры сами добавляют в текущие метрики своё время и
+попадания. Итог уходит в заголовок Server-Timing и строкой JSON
+в логгер core.metrics; повторы одного и того же SQL сверх
+METRICS_REPEATED_QUERY_THRESHOLD пишутся предупреждением как N+1.
+
+С TEMPLATE_PROFILE в строку метрик попадает и TemplateProfile: время
+каждого шаблона, в том числе подключённых через {% include %} внутри
+циклов, целиком и без вложенных шаблонов. Родитель из {% extends %}
+отрисовывается внутри дочернего шаблона и считается его временем.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import base as template_base
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('request_metrics', default=None)
+template_profile = ContextVar('template_profile', default=None)
+
+PLACEHOLDERS_RE = re.compile(r'\(\s*%s(\s*,\s*%s)*\s*\)')
+LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES_RE = re.compile(r'\s+')
+
+
+def sql_shape(sql):
+    """SQL без значений: запросы, отличающиеся только ими, совпадут."""
+    sql = LITERALS_RE.sub('?', sql)
+    sql = PLACEHOLDERS_RE.sub('(...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.shapes = Counter()
+        self.durations = defaultdict(float)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._active = set()
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - started
+            self.queries += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    @contextmanager
+    def timed(self, name):
+        """Добавляет время блока к метрике. Вложенные замеры не суммируются."""
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - started
+            self._active.discard(name)
+
+    def repeated_queries(self):
+        threshold = settings.METRICS_REPEATED_QUERY_THRESHOLD
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={self.durations["db"] * 1000:.1f}'
+            f';desc="{self.queries} queries"',
+        ]
+        for name in ('template', 'thumbnail'):
+            if name in self.durations:
+                parts.append(f'{name};dur={self.durations[name] * 1000:.1f}')
+        parts.append(
+            f'cache;desc="hits={self.cache_hits} misses={self.cache_misses}"'
+        )
+        repeated = self.repeated_queries()
+        if repeated:
+            parts.append(f'nplus1;desc="{len(repeated)} repeated queries"')
+        parts.append(f'total;dur={self.total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'duration_ms': {
+                name: round(value * 1000, 3)
+                for name, value in {
+                    **self.durations, 'total': self.total
+                }.items()
+            },
+            'cache': {'hits': self.cache_hits, 'misses': self.cache_misses},
+            'repeated_queries': [
+                {'sql': shape, 'count': count}
+                for shape, count in self.repeated_queries()
+            ],
+        }
+
+
+@contextmanager
+def timed(name):
+    """Замер блока в метриках текущего запроса, если они собираются."""
+    metrics = current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.timed(name):
+        yield
+
+
+def record_cache(hits=0, misses=0):
+    metrics = current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class TemplateProfile:
+    def __init__(self):
+        self.calls = Counter()
+        self.total = defaultdict(float)
+        self.own = defaultdict(float)
+        self._children = []
+
+    @contextmanager
+    def rendering(self, name):
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            self.calls[name] += 1
+            self.total[name] += elapsed
+            self.own[name] += elapsed - children
+            if self._children:
+                self._children[-1] += elapsed
+
+    def as_list(self, limit=None, requests=1):
+        """Шаблоны по убыванию собственного времени, на один запрос."""
+        names = sorted(self.own, key=self.own.get, reverse=True)[:limit]
+        return [
+            {
+                'template': name,
+                'calls': round(self.calls[name] / requests, 2),
+                'total_ms': round(self.total[name] * 1000 / requests, 3),
+                'own_ms': round(self.own[name] * 1000 / requests, 3),
+            }
+            for name in names
+        ]
+
+
+def _profiled(render):
+    @wraps(render)
+    def wrapper(template, context):
+        profile = template_profile.get()
+        if profile is None:
+            return render(template, context)
+        with profile.rendering(template.origin.template_name or '<string>'):
+            return render(template, context)
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_template_profiler():
+    """
+    Оборачивает Template.render, через который отрисовываются и
+    страницы, и {% include %}. Повторный вызов ничего не меняет.
+    """
+    if not getattr(template_base.Template.render, 'profiled', False):
+        template_base.Template.render = _profiled(
+            template_base.Template.render
+        )
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, замеряющий время отрисовки шаблонов."""
+
+    def from_string(self, template_code):
+        return Template(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return Template(
+            super().get_template(template_name).template, self
+        )
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        profile = None
+        if settings.TEMPLATE_PROFILE and template_profile.get() is None:
+            install_template_profiler()
+            profile = TemplateProfile()
+            profile_token = template_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+            if profile is not None:
+                template_profile.reset(profile_token)
+        response['Server-Timing'] = metrics.server_timing()
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }
+        if profile is not None:
+            record['templates'] = profile.as_list(
+                settings.TEMPLATE_PROFILE_TOP
+            )
+        logger.info(json.dumps(record, ensure_ascii=False))
+        for shape, count in metrics.repeated_queries():
+            logger.warning(
+                'Possible N+1 in %s: %d x %s', request.path, count, shape
+            )
+        return response
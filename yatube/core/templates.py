@@ -0,0 +1,46 @@
+"""
+Прогрев кэша шаблонов.
+
+С кэширующим загрузчиком шаблон компилируется при первой отрисовке
+в процессе, и первые запросы каждого воркера платят за разбор
+base.html, includes/article.html и остальных. warm_up() загружает
+все шаблоны из каталогов загрузчиков заранее, при запуске.
+"""
+import logging
+import os
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine):
+    """Имена всех шаблонов в каталогах загрузчиков движка."""
+    names = set()
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            for directory in inner.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for filename in files:
+                        if filename.endswith(('.html', '.txt')):
+                            names.add(os.path.relpath(
+                                os.path.join(root, filename), directory
+                            ).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_up():
+    """Загружает шаблоны всех движков Django. Возвращает их количество."""
+    loaded = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            try:
+                backend.engine.get_template(name)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as error:
+                logger.warning('Шаблон %s не загружен: %s', name, error)
+            else:
+                loaded += 1
+    return loaded
@@ -1,4 +1,25 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+
+from core import metrics
+from core.cache import Namespace
+from core.db import routers
+from core.db.backends.sqlite3.base import DatabaseWrapper
+from posts import cache as feed_cache
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +28,243 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SharedCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.backends.SQLiteCache',
+                'LOCATION': self.location,
+                'KEY_PREFIX': 'test',
+            }
+        })
+        self.settings.enable()
+        self.namespace = Namespace('test')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def run_in_worker(self, code):
+        """Выполняет код в отдельном процессе с тем же кэшем."""
+        subprocess.run(
+            [sys.executable, '-c', 'import django; django.setup(); ' + code],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'yatube.settings',
+                'CACHE_BACKEND': 'sqlite',
+                'CACHE_LOCATION': self.location,
+                'CACHE_KEY_PREFIX': 'test',
+            },
+            check=True,
+        )
+
+    def test_sqlite_cache_operations(self):
+        """Кэш в SQLite поддерживает основные операции"""
+        cache = self.namespace.cache
+        cache.set('key', {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value', 0))
+        self.assertIsNone(cache.get('new'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertEqual(cache.incr('a', 5), 6)
+        cache.delete('a')
+        self.assertFalse(cache.has_key('a'))
+
+    def test_namespace_invalidation(self):
+        """Сброс пространства имён не задевает другие пространства"""
+        other = Namespace('other')
+        self.namespace.set('key', 'value')
+        other.set('key', 'other value')
+        self.namespace.invalidate()
+        self.assertIsNone(self.namespace.get('key'))
+        self.assertEqual(other.get('key'), 'other value')
+
+    def test_invalidation_reaches_other_processes(self):
+        """Сброс кэша в одном процессе виден другим процессам"""
+        self.namespace.set('key', 'value')
+        self.run_in_worker(
+            'from core.cache import Namespace; '
+            'assert Namespace("test").get("key") == "value"; '
+            'Namespace("test").invalidate()'
+        )
+        self.assertIsNone(self.namespace.get('key'))
+
+    def test_feed_version_bumped_by_other_process(self):
+        """Версия ленты, изменённая другим воркером, видна сразу"""
+        before = feed_cache.get_version(feed_cache.ALL)
+        self.run_in_worker(
+            'from posts import cache; cache.bump(cache.ALL)'
+        )
+        self.assertNotEqual(feed_cache.get_version(feed_cache.ALL), before)
+
+
+class SettingsTests(SimpleTestCase):
+
+    def test_unknown_backend_is_improperly_configured(self):
+        """Неизвестные значения настроек из окружения - понятная ошибка"""
+        variables = ('CACHE_BACKEND', 'DB_ENGINE', 'DB_REPLICA_SELECTION')
+        for variable in variables:
+            with self.subTest(variable=variable):
+                result = subprocess.run(
+                    [sys.executable, '-c', 'import yatube.settings'],
+                    cwd=settings.BASE_DIR,
+                    env={**os.environ, variable: 'unknown'},
+                    capture_output=True,
+                    text=True,
+                )
+                self.assertNotEqual(result.returncode, 0)
+                self.assertIn('ImproperlyConfigured', result.stderr)
+                self.assertIn(f"{variable}='unknown'", result.stderr)
+
+
+class SQLitePragmaTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_new_connection_applies_pragmas(self):
+        """Новое соединение с файлом SQLite получает PRAGMA из OPTIONS"""
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'OPTIONS': {'pragmas': settings.SQLITE_PRAGMAS},
+        })
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            found = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                found[name] = cursor.fetchone()[0]
+        self.assertEqual(found, {
+            'journal_mode': 'wal',
+            'synchronous': 1,
+            'busy_timeout': settings.SQLITE_PRAGMAS['busy_timeout'],
+        })
+
+
+REPLICA_SCENARIO = """
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.urls import reverse
+from posts.models import User
+
+call_command('migrate', verbosity=0)
+call_command('sync_replicas', stdout=open(os.devnull, 'w'))
+writer = Client()
+writer.force_login(User.objects.create_user(username='writer'))
+response = writer.post(reverse('posts:post_create'), {'text': 'Свежий пост'})
+assert settings.REPLICA_PIN_COOKIE in response.cookies
+reader = Client()
+assert 'Свежий пост' not in reader.get('/').content.decode()
+assert 'Свежий пост' in writer.get('/').content.decode()
+call_command('sync_replicas', stdout=open(os.devnull, 'w'))
+cache.clear()  # иначе до REPLICA_CACHE_TIMEOUT виден фрагмент с реплики
+assert 'Свежий пост' in Client().get('/').content.decode()
+"""
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_reads_go_to_replica_until_own_write(self):
+        """Ленты читаются с реплики, а автор записи сразу видит её"""
+        subprocess.run(
+            [
+                sys.executable, '-c',
+                'import os, django; django.setup(); '
+                'from django.conf import settings; ' + REPLICA_SCENARIO,
+            ],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'yatube.settings',
+                'DB_NAME': os.path.join(self.directory, 'primary.sqlite3'),
+                'DB_REPLICAS': os.path.join(self.directory, 'replica.sqlite3'),
+            },
+            check=True,
+        )
+
+    @override_settings(DATABASE_REPLICAS={'first': 1, 'second': 3})
+    def test_replica_selection(self):
+        """Реплики выбираются по кругу или с учётом весов"""
+        with self.settings(REPLICA_SELECTION='round_robin'):
+            chosen = [routers.choose_replica() for _ in range(4)]
+        self.assertEqual(
+            sorted(chosen), ['first', 'first', 'second', 'second']
+        )
+        with self.settings(REPLICA_SELECTION='weighted'):
+            chosen = [routers.choose_replica() for _ in range(400)]
+        self.assertGreater(chosen.count('second'), chosen.count('first'))
+
+
+class RequestMetricsTests(TestCase):
+
+    def test_server_timing_header(self):
+        """Ответ несёт метрики запроса в Server-Timing"""
+        response = self.client.get('/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('template;dur=', timing)
+        self.assertRegex(timing, r'cache;desc="hits=\d+ misses=\d+"')
+
+    def test_sql_shape_ignores_values(self):
+        """Форма SQL не зависит от значений"""
+        self.assertEqual(
+            metrics.sql_shape("SELECT * FROM t WHERE id IN (%s, %s) AND "
+                              "name = 'a' LIMIT 21"),
+            metrics.sql_shape('SELECT * FROM t WHERE id IN (%s) AND '
+                              "name = 'bb' LIMIT 1"),
+        )
+
+    def test_repeated_queries_reported(self):
+        """Повторы одного запроса помечаются как N+1"""
+        User = get_user_model()
+
+        def view(request):
+            for pk in range(settings.METRICS_REPEATED_QUERY_THRESHOLD):
+                User.objects.filter(pk=pk).exists()
+            return HttpResponse()
+
+        middleware = metrics.RequestMetricsMiddleware(view)
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            response = middleware(RequestFactory().get('/n-plus-one/'))
+        self.assertIn('nplus1', response['Server-Timing'])
+        self.assertTrue(any('Possible N+1' in line for line in logs.output))
+        self.assertIn('"repeated_queries": [{', logs.output[0])
+
+    @override_settings(TEMPLATE_PROFILE=True, PAGE_CACHE=False)
+    def test_template_profile_counts_includes(self):
+        """Профиль шаблонов считает каждый include в цикле"""
+        author = get_user_model().objects.create_user(username='profiled')
+        for number in range(3):
+            author.posts.create(text=f'Пост {number}')
+        cache.clear()
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get('/')
+        templates = {
+            row['template']: row
+            for row in json.loads(logs.output[0].split(':', 2)[2])['templates']
+        }
+        self.assertEqual(templates['includes/article.html']['calls'], 3)
+        self.assertEqual(templates['posts/index.html']['calls'], 1)
+        self.assertIsNone(metrics.template_profile.get())
+
+    def test_profile_templates_requires_repeat(self):
+        """profile_templates не принимает --repeat меньше 1"""
+        for repeat in (0, -1):
+            with self.subTest(repeat=repeat):
+                with self.assertRaises(CommandError):
+                    call_command('profile_templates', '/', repeat=repeat)
@@ -1,10 +1,25 @@
 from django.contrib import admin
 
-from .models import Group, Post, Comment, Follow
+from . import search
+from .models import Group, Post, Comment, Follow, ThumbnailTask
+
+
+class IndexedSearchMixin:
+    """Поиск в админке по полнотекстовому индексу вместо LIKE."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        found = search.search_ids(search_term, self.search_kind)
+        return queryset.filter(pk__in=found), False
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_kind = search.POST
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
@@ -18,10 +33,19 @@ class FollowAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    search_kind = search.COMMENT
     list_display = ('post', 'text', 'author')
     search_fields = ('text',)
     empty_value_display = '-пусто-'
 
 
+@admin.register(ThumbnailTask)
+class ThumbnailTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'post', 'image', 'status', 'attempts', 'created', 'claimed_at',
+    )
+    list_filter = ('status',)
+
+
 admin.site.register(Group)
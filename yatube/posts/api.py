@@ -0,0 +1,266 @@
+"""
+JSON-версии лент и страницы поста, только для чтения.
+
+Посты и комментарии читаются через values() без создания моделей
+и листаются курсором (?cursor=, в ответе next и previous).
+?fields=id,text выбирает поля постов из POST_FIELDS. Ответы, как
+и HTML-страницы, читаются с реплик и отвечают 304 на условные запросы.
+Единственный пишущий адрес - following: подписки и отписки пачкой.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from core.db.routers import read_replica
+
+from . import cache as feed_cache
+from . import follows, graph, timeline
+from .models import Comment, Group, Post, User
+from .paginators import CursorPaginator
+from .views import group_scopes, index_scopes, post_scopes, profile_scopes
+
+# Поле в ответе: путь для values().
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated_at': 'updated_at',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+
+COMMENT_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+AUTHOR_FIELDS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'stats__posts_count',
+    'followers_count': 'stats__followers_count',
+    'following_count': 'stats__following_count',
+}
+
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+
+
+def error(message, status):
+    return JsonResponse(
+        {'error': message}, status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def respond(data):
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+def api_view(view):
+    """Неверные параметры запроса (ValueError) отвечают 400."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ValueError as exception:
+            return error(str(exception), 400)
+    return wrapper
+
+
+def selected_fields(request):
+    """Поля постов из ?fields=, по умолчанию все."""
+    names = [
+        name.strip()
+        for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ]
+    unknown = set(names) - set(POST_FIELDS)
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return names or list(POST_FIELDS)
+
+
+def serialize(row, names, fields):
+    record = {name: row[fields[name]] for name in names}
+    if 'image' in record:
+        record['image'] = (
+            default_storage.url(record['image']) if record['image'] else None
+        )
+    return record
+
+
+def paginate(request, queryset, names, fields, per_page, ordering=None):
+    """Страница после ?cursor= в виде словарей только с полями names."""
+    ordering = ordering or CursorPaginator.ordering
+    paths = {fields[name] for name in names} | {
+        field.lstrip('-') for field in ordering
+    }
+    page = CursorPaginator(
+        queryset.values(*paths), per_page, ordering=ordering
+    ).get_cursor_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(row, names, fields) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def posts_page(request, queryset, ordering=None):
+    return paginate(
+        request, queryset, selected_fields(request), POST_FIELDS,
+        settings.NUMBER_OF_POSTS, ordering,
+    )
+
+
+def first(queryset, fields):
+    """Первая строка queryset с полями fields или None."""
+    row = queryset.values(*fields.values()).first()
+    return None if row is None else serialize(row, list(fields), fields)
+
+
+@read_replica
+@feed_cache.conditional(index_scopes)
+@api_view
+def index(request):
+    return respond(posts_page(request, Post.objects.all()))
+
+
+@read_replica
+@feed_cache.conditional(group_scopes)
+@api_view
+def group_posts(request, slug):
+    group = first(Group.objects.filter(slug=slug), GROUP_FIELDS)
+    if group is None:
+        return error('Группа не найдена', 404)
+    return respond({
+        'group': group,
+        **posts_page(request, Post.objects.filter(group__slug=slug)),
+    })
+
+
+@read_replica
+@feed_cache.conditional(profile_scopes)
+@api_view
+def profile(request, username):
+    author = first(User.objects.filter(username=username), AUTHOR_FIELDS)
+    if author is None:
+        return error('Автор не найден', 404)
+    return respond({
+        'author': author,
+        **posts_page(
+            request, Post.objects.filter(author__username=username)
+        ),
+    })
+
+
+@read_replica
+@feed_cache.conditional(post_scopes)
+@api_view
+def post_detail(request, post_id):
+    names = selected_fields(request)
+    post = Post.objects.filter(pk=post_id).values(
+        *{POST_FIELDS[name] for name in names}
+    ).first()
+    if post is None:
+        return error('Пост не найден', 404)
+    comments = paginate(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        list(COMMENT_FIELDS),
+        COMMENT_FIELDS,
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+    return respond({
+        'post': serialize(post, names, POST_FIELDS),
+        'comments': comments,
+    })
+
+
+def follow_scopes(request):
+    if not request.user.is_authenticated:
+        return None
+    return [feed_cache.ALL, feed_cache.follow_scope(request.user.pk)]
+
+
+@read_replica
+@feed_cache.conditional(follow_scopes)
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error('Нужно войти', 401)
+    return respond(posts_page(
+        request, timeline.feed(request.user), timeline.FEED_ORDERING
+    ))
+
+
+def usernames(data, field):
+    names = data.get(field, [])
+    if not isinstance(names, list) or not all(
+        isinstance(name, str) for name in names
+    ):
+        raise ValueError(f'{field} - список username')
+    return set(names)
+
+
+@require_http_methods(['GET', 'POST'])
+@api_view
+def following(request):
+    """
+    GET - на кого подписан пользователь. POST {"follow": [...],
+    "unfollow": [...]} с username авторов подписывает и отписывает
+    пачкой; повтор того же запроса ничего не меняет.
+    """
+    if not request.user.is_authenticated:
+        return error('Нужно войти', 401)
+    if request.method == 'GET':
+        return respond({'following': list(
+            User.objects.filter(
+                pk__in=graph.following(request.user.pk)
+            ).order_by('username').values_list('username', flat=True)
+        )})
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValueError('Тело запроса - не JSON')
+    if not isinstance(data, dict):
+        raise ValueError('Тело запроса - не JSON-объект')
+    follow, unfollow = usernames(data, 'follow'), usernames(data, 'unfollow')
+    if follow & unfollow:
+        raise ValueError(
+            f'И follow, и unfollow: {", ".join(sorted(follow & unfollow))}'
+        )
+    if len(follow | unfollow) > settings.FOLLOW_BATCH_LIMIT:
+        raise ValueError(
+            f'Не больше {settings.FOLLOW_BATCH_LIMIT} авторов за запрос'
+        )
+    ids = dict(
+        User.objects.filter(
+            username__in=follow | unfollow
+        ).values_list('username', 'pk')
+    )
+    names = {pk: name for name, pk in ids.items()}
+    followed = follows.follow_many(
+        request.user.pk, (ids[name] for name in follow if name in ids)
+    )
+    unfollowed = follows.unfollow_many(
+        request.user.pk, (ids[name] for name in unfollow if name in ids)
+    )
+    return respond({
+        'followed': sorted(names[pk] for pk in followed),
+        'unfollowed': sorted(names[pk] for pk in unfollowed),
+        'unknown': sorted((follow | unfollow) - set(ids)),
+    })
@@ -0,0 +1,532 @@
+"""
+Синтетические данные и замеры представлений ленты.
+
+seed() наполняет БД пользователями, группами, постами, комментариями
+и подписками со степенным распределением: немногие авторы пишут
+большую часть постов и собирают большую часть подписчиков, немногие
+посты собирают большую часть комментариев.
+
+run() открывает index, group_posts, profile, post_detail и follow_index
+на первой и на глубокой странице и возвращает задержки и количество
+SQL-запросов в виде словаря, который команда benchmark_views пишет
+в JSON. compare() сравнивает два таких результата.
+
+query_plans() показывает планы запросов лент с индексами под них
+и без этих индексов (они удаляются в откатываемой транзакции).
+
+concurrency() запускает параллельные процессы: писатели создают посты
+через post_create, читатели открывают index. Так видно, как СУБД
+держит одновременную запись и чтение (блокировки, ошибки, задержки).
+"""
+import itertools
+import multiprocessing
+import random
+import statistics
+import subprocess
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import (
+    NotSupportedError, connection, connections, transaction,
+)
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import counters, search, timeline, transfer
+from .models import Comment, Follow, Group, Post, User
+from .paginators import CursorPaginator
+
+USERNAME_PREFIX = 'bench'
+
+# Индексы под запросы лент, которые query_plans() умеет отключать.
+FEED_INDEXES = (
+    'post_group_pub_date_idx',
+    'post_author_pub_date_idx',
+    'follow_author_user_idx',
+    'comment_post_created_idx',
+    'timeline_user_date_idx',
+)
+
+
+def zipf_weights(size, alpha=1.1):
+    """Накопленные веса рангов 1..size по закону Ципфа."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, size + 1)
+    ))
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _save(model, objects, batch_size, dates=()):
+    saved = 0
+    with transfer.keep_dates(*(model._meta.get_field(f) for f in dates)):
+        for batch in _batches(objects, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            saved += len(batch)
+    return saved
+
+
+def seed(users=1000, posts=10000, groups=20, comments=20000,
+         follows_per_user=20, batch_size=5000, alpha=1.1, seed=None,
+         log=None):
+    """
+    Добавляет в БД синтетические данные.
+    Возвращает количество созданных записей по моделям.
+    """
+    rng = random.Random(seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    texts = [fake.paragraph(nb_sentences=5) for _ in range(500)]
+    now = timezone.now()
+    created = Counter()
+    log = log or (lambda message: None)
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+    start = User.objects.filter(
+        username__startswith=USERNAME_PREFIX
+    ).count()
+    password = make_password(None)
+    created['user'] = _save(User, (
+        User(
+            username=f'{USERNAME_PREFIX}{start + number}',
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+            password=password,
+        )
+        for number in range(users)
+    ), batch_size)
+    log(f'Пользователей: {created["user"]}')
+    user_ids = list(
+        User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).values_list('pk', flat=True)
+    )
+    counters.create_user_stats(user_ids)
+    rng.shuffle(user_ids)
+    user_weights = zipf_weights(len(user_ids), alpha)
+
+    group_start = Group.objects.count()
+    created['group'] = _save(Group, (
+        Group(
+            title=fake.catch_phrase()[:200],
+            slug=f'{USERNAME_PREFIX}-{group_start + number}',
+            description=fake.paragraph(),
+        )
+        for number in range(groups)
+    ), batch_size)
+    group_ids = [None] + list(Group.objects.values_list('pk', flat=True))
+    group_weights = zipf_weights(len(group_ids), alpha)
+
+    created['post'] = _save(Post, (
+        Post(
+            author_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+            group_id=rng.choices(group_ids, cum_weights=group_weights)[0],
+            text=rng.choice(texts),
+            pub_date=moment(),
+        )
+        for _ in range(posts)
+    ), batch_size, dates=('pub_date',))
+    log(f'Постов: {created["post"]}')
+
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    rng.shuffle(post_ids)
+    post_weights = zipf_weights(len(post_ids), alpha)
+    created['comment'] = _save(Comment, (
+        Comment(
+            post_id=rng.choices(post_ids, cum_weights=post_weights)[0],
+            author_id=rng.choice(user_ids),
+            text=rng.choice(texts)[:200],
+            created=moment(),
+        )
+        for _ in range(comments if post_ids else 0)
+    ), batch_size, dates=('created',))
+    log(f'Комментариев: {created["comment"]}')
+
+    pairs = (
+        (
+            rng.choice(user_ids),
+            rng.choices(user_ids, cum_weights=user_weights)[0],
+        )
+        for _ in range(len(user_ids) * follows_per_user)
+    )
+    created['follow'] = _save(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in pairs if user_id != author_id
+    ), batch_size)
+    log(f'Подписок (с повторами): {created["follow"]}')
+
+    transfer.finish()
+    search.rebuild()
+    return created
+
+
+def _page_count(total):
+    return max(1, -(-total // settings.NUMBER_OF_POSTS))
+
+
+def targets():
+    """Самые тяжёлые объекты для замеров."""
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total').first()
+    author = User.objects.select_related('stats').order_by(
+        '-stats__posts_count'
+    ).first()
+    reader = User.objects.select_related('stats').order_by(
+        '-stats__following_count'
+    ).first()
+    post = Post.objects.order_by('-comments_count').first()
+    return group, author, reader, post
+
+
+def cases(deep_page=None):
+    """Названия, адреса и пользователь для каждого замера."""
+    group, author, reader, post = targets()
+    found = []
+
+    def add(name, url, total, user=None):
+        last = _page_count(total)
+        deep = min(deep_page or last, last)
+        found.append((f'{name}:first', url, user))
+        found.append((f'{name}:deep', f'{url}?page={deep}', user))
+
+    add('index', reverse('posts:index'), Post.objects.count())
+    if group is not None:
+        add(
+            'group_posts',
+            reverse('posts:group_list', args=(group.slug,)),
+            group.total,
+        )
+    if author is not None:
+        add(
+            'profile',
+            reverse('posts:profile', args=(author.username,)),
+            author.stats.posts_count,
+        )
+    if reader is not None:
+        add(
+            'follow_index',
+            reverse('posts:follow_index'),
+            Post.objects.filter(
+                author__following__user=reader
+            ).count(),
+            reader,
+        )
+    if post is not None:
+        found.append((
+            'post_detail',
+            reverse('posts:post_detail', args=(post.pk,)),
+            None,
+        ))
+    return found
+
+
+def measure(client, url, repeat=5, warmup=1, cold=False):
+    """Задержки в миллисекундах и количество запросов для одного адреса."""
+    timings = []
+    queries = []
+    status = None
+    for attempt in range(warmup + repeat):
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+        status = response.status_code
+        if attempt >= warmup:
+            timings.append(elapsed)
+            queries.append(len(captured))
+    timings.sort()
+    return {
+        'url': url,
+        'status': status,
+        'queries': max(queries),
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[int(0.95 * (len(timings) - 1))], 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=5, warmup=1, cold=False, deep_page=None):
+    """Замеряет все представления и возвращает результат для JSON."""
+    results = {}
+    for name, url, user in cases(deep_page):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        results[name] = measure(client, url, repeat, warmup, cold)
+    return {
+        'commit': _git_commit(),
+        'created': timezone.now().isoformat(),
+        'settings': {
+            'cache_backend': settings.CACHES['default']['BACKEND'],
+            'database': connection.vendor,
+            'feed_pagination': settings.FEED_PAGINATION,
+            'cold_cache': cold,
+            'repeat': repeat,
+        },
+        'dataset': {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=0.2):
+    """
+    Строки сравнения двух прогонов и признак регрессии: медиана выросла
+    больше чем на threshold или стало больше запросов.
+    """
+    lines = []
+    regressed = False
+    for name, current in new['results'].items():
+        previous = old['results'].get(name)
+        if previous is None:
+            lines.append(f'{name}: новый замер')
+            continue
+        change = (
+            current['median_ms'] / previous['median_ms'] - 1
+            if previous['median_ms'] else 0
+        )
+        worse = (
+            change > threshold or current['queries'] > previous['queries']
+        )
+        regressed = regressed or worse
+        lines.append(
+            f'{name}: {previous["median_ms"]} -> {current["median_ms"]} мс '
+            f'({change:+.0%}), запросов {previous["queries"]} -> '
+            f'{current["queries"]}{" РЕГРЕССИЯ" if worse else ""}'
+        )
+    return lines, regressed
+
+
+def feed_queries():
+    """Запросы страниц лент в том виде, в каком их выполняют views."""
+    group, author, reader, post = targets()
+    size = settings.NUMBER_OF_POSTS
+    queries = {'index': Post.objects.select_related('author', 'group')}
+    if group is not None:
+        queries['group_posts'] = group.posts.select_related('author')
+    if author is not None:
+        queries['profile'] = author.posts.select_related('group')
+        queries['followers'] = Follow.objects.filter(
+            author=author
+        ).values_list('user_id', flat=True)
+    if reader is not None:
+        queries['follow_index'] = timeline.feed(reader)
+    found = {}
+    orderings = {'follow_index': timeline.FEED_ORDERING}
+    for name, queryset in queries.items():
+        if name == 'followers':
+            found[name] = queryset
+            continue
+        found[f'{name}:page'] = queryset[:size]
+        found[f'{name}:cursor'] = CursorPaginator(
+            queryset, size, ordering=orderings.get(name)
+        ).object_list[:size + 1]
+    if post is not None:
+        found['comments'] = CursorPaginator(
+            Comment.objects.filter(post=post).select_related('author'),
+            settings.COMMENTS_PER_PAGE,
+            ordering=('created', 'id'),
+        ).object_list[:settings.COMMENTS_PER_PAGE + 1]
+    return found
+
+
+_explained = itertools.count()
+
+
+def explain(queryset):
+    """Строки плана выполнения запроса."""
+    sql, params = queryset.query.sql_with_params()
+    prefix = (
+        'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    )
+    with connection.cursor() as cursor:
+        # Уникальный текст не даёт sqlite3 взять план из кэша выражений,
+        # подготовленный до удаления индексов.
+        cursor.execute(f'{prefix} /* {next(_explained)} */ {sql}', params)
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+def _timed(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset._chain())
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def query_plans(repeat=5):
+    """
+    Планы и медианное время запросов лент с индексами FEED_INDEXES
+    и без них: {запрос: {'with': {...}, 'without': {...}}}.
+    Только для SQLite: на других СУБД DROP INDEX в транзакции держал бы
+    эксклюзивную блокировку таблиц рабочей БД до её отката.
+    """
+    if connection.vendor != 'sqlite':
+        raise NotSupportedError(
+            f'Планы без индексов сравниваются только на SQLite, '
+            f'а не на {connection.vendor}'
+        )
+    queries = feed_queries()
+    result = {
+        name: {'with': {'plan': explain(queryset),
+                        'ms': _timed(queryset, repeat)}}
+        for name, queryset in queries.items()
+    }
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for name in FEED_INDEXES:
+                cursor.execute(
+                    f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}'
+                )
+        for name, queryset in queries.items():
+            result[name]['without'] = {
+                'plan': explain(queryset),
+                'ms': _timed(queryset, repeat),
+            }
+        transaction.set_rollback(True)
+    return result
+
+
+def _summary(timings, errors, elapsed):
+    timings = sorted(timings)
+    summary = {
+        'requests': len(timings),
+        'errors': errors,
+        'per_second': round(len(timings) / elapsed, 1),
+    }
+    if timings:
+        summary.update({
+            'median_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(timings[int(0.95 * (len(timings) - 1))], 3),
+            'max_ms': round(timings[-1], 3),
+        })
+    return summary
+
+
+def _concurrency_worker(role, number, user_id, duration, results):
+    client = Client()
+    if user_id is not None:
+        client.force_login(User.objects.get(pk=user_id))
+    url = reverse('posts:post_create' if role == 'writer' else 'posts:index')
+    timings = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'writer':
+                response = client.post(
+                    url, {'text': f'Конкурентная запись {number}'}
+                )
+            else:
+                response = client.get(url)
+            failed = response.status_code >= 400
+        except Exception:
+            failed = True
+        if failed:
+            errors += 1
+        else:
+            timings.append((time.perf_counter() - started) * 1000)
+    results.put((role, timings, errors))
+    connections.close_all()
+
+
+def concurrency(writers=2, readers=4, duration=10):
+    """
+    Нагрузка из writers процессов, создающих посты, и readers процессов,
+    читающих главную страницу, в течение duration секунд.
+    Посты писателей остаются в БД у пользователей bench-writer-N.
+    """
+    password = make_password(None)
+    writer_ids = [
+        User.objects.get_or_create(
+            username=f'{USERNAME_PREFIX}-writer-{number}',
+            defaults={'password': password},
+        )[0].pk
+        for number in range(writers)
+    ]
+    # Процессы наследуют открытые соединения при fork - закрываем их.
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [
+        context.Process(
+            target=_concurrency_worker,
+            args=('writer', number, user_id, duration, results),
+        )
+        for number, user_id in enumerate(writer_ids)
+    ] + [
+        context.Process(
+            target=_concurrency_worker,
+            args=('reader', number, None, duration, results),
+        )
+        for number in range(readers)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    collected = {'writer': ([], 0), 'reader': ([], 0)}
+    for _ in workers:
+        role, timings, errors = results.get()
+        total, failed = collected[role]
+        collected[role] = (total + timings, failed + errors)
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {
+        'commit': _git_commit(),
+        'created': timezone.now().isoformat(),
+        'settings': {
+            'database': settings.DATABASES['default']['ENGINE'],
+            'conn_max_age': settings.DATABASES['default']['CONN_MAX_AGE'],
+            'cache_backend': settings.CACHES['default']['BACKEND'],
+            'writers': writers,
+            'readers': readers,
+            'duration': duration,
+        },
+        'results': {
+            role: _summary(timings, errors, elapsed)
+            for role, (timings, errors) in collected.items()
+        },
+    }
@@ -0,0 +1,258 @@
+"""
+Версии кэшированных фрагментов лент.
+
+Каждая область (вся лента, группа, автор, подписки читателя) хранит
+в кэше случайный токен версии. Токен входит в ключ фрагмента, поэтому
+фрагменты живут бессрочно, а сигналы моделей сбрасывают их сменой
+токена только тогда, когда данные действительно изменились.
+
+Токен начинается со времени смены, поэтому по версиям строятся и
+валидаторы условных GET-запросов (conditional): ETag и Last-Modified
+получаются без запросов к данным лент. По тем же версиям page_cache
+кэширует целые страницы для анонимных посетителей.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from core.cache import Namespace, new_token
+from core.db.routers import current_replica
+
+versions = Namespace('feed')
+pages = Namespace('page')
+
+ALL = 'all'
+USERS = 'users'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def followers_scope(author_id):
+    return f'followers:{author_id}'
+
+
+# Области самих записей, а не лент: по ним версионируются фрагменты
+# отдельных постов (posts.fragments).
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def group_info_scope(group_id):
+    return f'group-info:{group_id}'
+
+
+def post_scopes(author_id, *group_ids):
+    """Области лент, в которых показывается пост."""
+    return [
+        ALL,
+        author_scope(author_id),
+        *(group_scope(group_id) for group_id in set(group_ids) if group_id),
+    ]
+
+
+def new_version():
+    return f'{int(time.time())}-{new_token()}'
+
+
+def get_versions(*scopes):
+    """Токены версий областей, недостающие создаются."""
+    found = versions.get_many(scopes)
+    missing = [scope for scope in scopes if scope not in found]
+    if missing:
+        for scope in missing:
+            versions.add(scope, new_version(), None)
+        found.update(versions.get_many(missing))
+    return [str(found.get(scope, '')) for scope in scopes]
+
+
+def get_version(*scopes):
+    """Общая версия для набора областей."""
+    return '.'.join(get_versions(*scopes))
+
+
+def last_modified(*scopes):
+    """Время последней смены версии любой из областей."""
+    stamps = [
+        token.partition('-')[0] for token in get_versions(*scopes)
+    ]
+    stamp = max(
+        int(stamp) if stamp.isdigit() else int(time.time())
+        for stamp in stamps
+    )
+    return datetime.fromtimestamp(stamp, timezone.utc)
+
+
+def _set_versions(scopes):
+    versions.set_many({scope: new_version() for scope in scopes}, None)
+
+
+def bump(*scopes):
+    """
+    Делает недействительными фрагменты перечисленных областей: сразу
+    и, внутри транзакции, ещё раз после коммита. Иначе запрос, который
+    между сменой версии и коммитом отрисовал фрагмент по старым данным,
+    оставил бы его в кэше под новой версией.
+    """
+    _set_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(partial(_set_versions, scopes))
+
+
+def cache_params(scopes, timeout):
+    """Версия для ключа и срок жизни кэша областей scopes."""
+    return replica_params(get_version(*scopes), timeout)
+
+
+def replica_params(version, timeout):
+    """Версия и срок жизни кэша с поправкой на чтение с реплики."""
+    replica = current_replica()
+    if replica is not None:
+        # Реплика может ещё не видеть изменения, сменившие версию.
+        return f'{version}.{replica}', settings.REPLICA_CACHE_TIMEOUT
+    return version, timeout
+
+
+def fragment_context(*scopes):
+    """Переменные контекста для тега {% cache %} в шаблонах лент."""
+    version, timeout = cache_params(scopes, settings.FEED_CACHE_TIMEOUT)
+    return {
+        'cache_timeout': timeout,
+        'cache_version': version,
+    }
+
+
+def request_scopes(request, get_scopes, *args, **kwargs):
+    """Области страницы; get_scopes вызывается один раз на запрос."""
+    if not hasattr(request, '_feed_scopes'):
+        request._feed_scopes = get_scopes(request, *args, **kwargs)
+    return request._feed_scopes
+
+
+def conditional(get_scopes):
+    """
+    Отвечает 304 на If-None-Match и If-Modified-Since до вызова
+    представления. get_scopes(request, *args, **kwargs) возвращает
+    области, версии которых покрывают всю страницу, или None, если
+    валидаторы не нужны (например, объекта нет и будет 404).
+    Страницы, прочитанные с реплики, валидаторов не получают: реплика
+    может отставать от версий.
+    """
+    def scopes(request, *args, **kwargs):
+        if current_replica() is not None:
+            return None
+        return request_scopes(request, get_scopes, *args, **kwargs)
+
+    def etag(request, *args, **kwargs):
+        found = scopes(request, *args, **kwargs)
+        if found is None:
+            return None
+        return hashlib.md5(
+            f'{get_version(*found)}:{request.user.pk}'.encode()
+        ).hexdigest()
+
+    def modified(request, *args, **kwargs):
+        found = scopes(request, *args, **kwargs)
+        return None if found is None else last_modified(*found)
+
+    def decorator(view):
+        return cache_control(private=True, no_cache=True)(
+            condition(etag, modified)(view)
+        )
+    return decorator
+
+
+def page_cacheable(request):
+    """Анонимный GET без cookie и без лишних параметров запроса."""
+    return (
+        settings.PAGE_CACHE
+        and request.method in ('GET', 'HEAD')
+        and not request.COOKIES
+        and set(request.GET) <= settings.PAGE_CACHE_PARAMS
+    )
+
+
+def _wait_for_page(key):
+    deadline = time.monotonic() + settings.PAGE_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(settings.PAGE_CACHE_POLL_INTERVAL)
+        cached = pages.get(key)
+        if cached is not None:
+            return cached
+    return None
+
+
+def page_cache(get_scopes):
+    """
+    Кэширует страницу целиком для page_cacheable запросов. Ключ - путь
+    с параметрами и версии областей get_scopes, поэтому сигналы моделей
+    сбрасывают страницы вместе с фрагментами. Холодный ключ рисует один
+    запрос, остальные до PAGE_CACHE_WAIT секунд ждут его результат
+    в кэше, а не рисуют ту же страницу параллельно.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not page_cacheable(request):
+                return view(request, *args, **kwargs)
+            scopes = request_scopes(request, get_scopes, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            version, timeout = cache_params(
+                scopes, settings.PAGE_CACHE_TIMEOUT
+            )
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f'{version}:{path}'
+            cached = pages.get(key)
+            locked = False
+            if cached is None:
+                locked = pages.add(
+                    f'lock:{key}', True, settings.PAGE_CACHE_LOCK_TIMEOUT
+                )
+                if not locked:
+                    cached = _wait_for_page(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'hit'
+                return response
+            try:
+                response = view(request, *args, **kwargs)
+                # Страница с CSRF-токеном нужна вместе с cookie, которую
+                # ставит CsrfViewMiddleware, - такие не кэшируются.
+                if (
+                    response.status_code == 200
+                    and not response.cookies
+                    and not request.META.get('CSRF_COOKIE_USED')
+                ):
+                    pages.set(
+                        key, (response.content, response['Content-Type']),
+                        timeout,
+                    )
+            finally:
+                if locked:
+                    pages.delete(f'lock:{key}')
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,141 @@
+"""
+Лента изменений постов и комментариев.
+
+Изменённые посты (по updated_at), новые комментарии (по created)
+и удаления тех и других (Tombstone) идут одним потоком в порядке
+времени. Курсор запоминает время, вид и pk последней выданной записи,
+поэтому следующий запрос продолжает поток без повторов и пропусков.
+Записи совпадают по полям с выгрузкой transfer; удаление выглядит как
+{'model': 'post', 'id': 1, 'deleted_at': ...}.
+
+Изменения моложе CHANGES_DELAY секунд не выдаются: транзакция,
+начатая раньше, может зафиксироваться позже и оказалась бы позади
+уже выданного курсора.
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import transfer
+from .models import Comment, Post, Tombstone
+
+POST = 'post'
+COMMENT = 'comment'
+DELETED = 'deleted'
+# Порядок видов при одинаковом времени изменения.
+KINDS = (POST, COMMENT, DELETED)
+
+QUERYSETS = {
+    POST: lambda: Post.objects.order_by(),
+    COMMENT: lambda: Comment.objects.order_by(),
+    DELETED: lambda: Tombstone.objects.order_by(),
+}
+
+TIME_FIELDS = {
+    POST: 'updated_at',
+    COMMENT: 'created',
+    DELETED: 'deleted_at',
+}
+
+# Поле записи: путь для values().
+FIELDS = {
+    POST: {**transfer.FIELDS[transfer.POST], 'updated_at': 'updated_at'},
+    COMMENT: transfer.FIELDS[transfer.COMMENT],
+    DELETED: {
+        'model': 'kind',
+        'id': 'object_id',
+        'deleted_at': 'deleted_at',
+    },
+}
+
+
+def encode_cursor(position):
+    changed, rank, pk = position
+    data = json.dumps(
+        [changed.isoformat(), rank, pk], separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def parse_since(since):
+    """
+    Позиция (время, вид, pk), после которой выдаются изменения.
+    since - курсор прошлого ответа или момент времени в ISO 8601
+    (изменения в сам этот момент тоже выдаются).
+    """
+    if not since:
+        return None
+    # "+" часового пояса в строке запроса превращается в пробел.
+    changed = parse_datetime(since.replace(' ', '+'))
+    if changed is not None:
+        if timezone.is_naive(changed):
+            changed = timezone.make_aware(changed, timezone.utc)
+        return changed, -1, 0
+    try:
+        padding = '=' * (-len(since) % 4)
+        changed, rank, pk = json.loads(
+            base64.urlsafe_b64decode(since + padding).decode()
+        )
+        changed = parse_datetime(changed)
+    except (ValueError, TypeError, binascii.Error):
+        changed = None
+    if changed is None:
+        raise ValueError(f'Неверный курсор или время: {since}')
+    return changed, int(rank), int(pk)
+
+
+def _after(field, rank, position):
+    """Условие "строго после position" для вида с номером rank."""
+    changed, position_rank, pk = position
+    condition = Q(**{f'{field}__gt': changed})
+    if rank > position_rank:
+        condition |= Q(**{field: changed})
+    elif rank == position_rank:
+        condition |= Q(**{field: changed, 'pk__gt': pk})
+    return condition
+
+
+def changes(since=None, limit=None):
+    """
+    Изменения после since: {'changes': [...], 'cursor': ...,
+    'has_more': ...}. Курсор годится для следующего запроса, даже
+    если изменений пока нет.
+    """
+    if limit is None:
+        limit = settings.CHANGES_PAGE_SIZE
+    if limit < 1:
+        raise ValueError(f'limit должен быть не меньше 1: {limit}')
+    limit = min(limit, settings.CHANGES_MAX_PAGE_SIZE)
+    position = parse_since(since)
+    until = timezone.now() - timedelta(seconds=settings.CHANGES_DELAY)
+    found = []
+    for rank, kind in enumerate(KINDS):
+        field = TIME_FIELDS[kind]
+        queryset = QUERYSETS[kind]().filter(**{f'{field}__lte': until})
+        if position is not None:
+            queryset = queryset.filter(_after(field, rank, position))
+        fields = FIELDS[kind]
+        rows = queryset.order_by(field, 'pk').values_list(
+            field, 'pk', *fields.values()
+        )[:limit + 1]
+        for changed, pk, *values in rows:
+            found.append((
+                (changed, rank, pk),
+                {'model': kind, **dict(zip(fields, values))},
+            ))
+    found.sort(key=lambda item: item[0])
+    has_more = len(found) > limit
+    del found[limit:]
+    if found:
+        position = found[-1][0]
+    return {
+        'changes': [record for _, record in found],
+        'cursor': encode_cursor(position) if position else since or '',
+        'has_more': has_more,
+    }
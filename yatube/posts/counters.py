@@ -0,0 +1,83 @@
+"""
+Денормализованные счётчики.
+
+Количество постов, подписчиков и подписок пользователя хранится
+в UserStats, количество комментариев - в Post.comments_count.
+Сигналы меняют счётчики атомарно через F(), а recount пересчитывает
+их по таблицам, если значения разошлись.
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def _count(model, field, outer):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def change_user_stats(user_id, **deltas):
+    """Атомарно меняет счётчики пользователя на заданные величины."""
+    change_users_stats([user_id], **deltas)
+
+
+def change_users_stats(user_ids, **deltas):
+    """Те же изменения счётчиков нескольких пользователей, UPDATE на поле."""
+    user_ids = set(user_ids)
+    for field, delta in deltas.items():
+        stats = UserStats.objects.filter(user_id__in=user_ids)
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+        updated = stats.update(**{field: F(field) + delta})
+        if updated < len(user_ids) and delta > 0:
+            recount_users(user_ids)
+
+
+def change_comments_count(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def create_user_stats(user_ids):
+    """
+    Нулевые счётчики для пользователей, созданных через bulk_create:
+    сигнал post_save, который заводит их обычно, не срабатывает.
+    """
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def recount_users(user_ids=None):
+    """Пересчитывает счётчики пользователей. Возвращает их количество."""
+    users = User.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    create_user_stats(
+        users.filter(stats__isnull=True).values_list('pk', flat=True)
+    )
+    return UserStats.objects.filter(user__in=users).update(
+        posts_count=_count(Post, 'author', 'user_id'),
+        followers_count=_count(Follow, 'author', 'user_id'),
+        following_count=_count(Follow, 'user', 'user_id'),
+    )
+
+
+def recount_posts(post_ids=None):
+    """Пересчитывает комментарии постов. Возвращает количество постов."""
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    return posts.update(comments_count=_count(Comment, 'post', 'pk'))
@@ -0,0 +1,151 @@
+"""
+Подписки читателя.
+
+FollowSet один раз за запрос берёт из графа подписок (posts.graph)
+отсортированный массив авторов, на которых подписан читатель. Дальше
+is_following(author) и {% if author.pk in follows %} в шаблоне
+отвечают бинарным поиском по нему, сколько бы авторов ни было
+на странице.
+
+follow_many и unfollow_many подписывают и отписывают пачкой: одна
+вставка или одно удаление без сигналов моделей, а счётчики, ленты,
+граф и версии кэша обновляются один раз на пачку. Изменения подписок
+одного читателя идут по очереди под блокировкой его строки User, а
+какие подписки действительно вставлены или удалены, проверяется
+повторным чтением в той же транзакции.
+"""
+from array import array
+from functools import partial
+
+from django.db import transaction
+
+from . import cache as feed_cache
+from . import counters, graph, timeline
+from .models import Follow, User
+
+
+class FollowSet:
+    def __init__(self, user):
+        self.user = user
+        self._ids = None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = (
+                graph.following(self.user.pk)
+                if self.user.is_authenticated else array('q')
+            )
+        return self._ids
+
+    def is_following(self, author):
+        """author - пользователь или его id."""
+        return graph.contains(self.ids, getattr(author, 'pk', author))
+
+    __contains__ = is_following
+
+
+def for_request(request):
+    """FollowSet читателя, один на запрос."""
+    if not hasattr(request, '_follow_set'):
+        request._follow_set = FollowSet(request.user)
+    return request._follow_set
+
+
+def _after_change(user_id, author_ids, delta):
+    """
+    То, что для каждой подписки сделали бы сигналы Follow; delta - 1
+    для подписок и -1 для отписок.
+    """
+    counters.change_user_stats(
+        user_id, following_count=delta * len(author_ids)
+    )
+    counters.change_users_stats(author_ids, followers_count=delta)
+    _bump(user_id, author_ids)
+
+
+def _bump(user_id, author_ids):
+    feed_cache.bump(
+        feed_cache.follow_scope(user_id),
+        *(feed_cache.followers_scope(author_id) for author_id in author_ids),
+    )
+
+
+def _lock_follower(user_id):
+    """
+    Блокирует до конца транзакции строку читателя: второй пакетный
+    запрос на изменение его подписок ждёт, пока первый не закончит.
+    """
+    list(User.objects.select_for_update().filter(
+        pk=user_id
+    ).values_list('pk', flat=True))
+
+
+def _followed(user_id, author_ids):
+    return set(Follow.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def follow_many(user_id, author_ids):
+    """
+    Подписывает user_id на авторов author_ids. Подписки, которые уже
+    есть, и подписка на себя пропускаются. Возвращает id новых.
+    """
+    author_ids = set(author_ids) - {user_id}
+    if not author_ids:
+        return []
+    with transaction.atomic():
+        _lock_follower(user_id)
+        existing = _followed(user_id, author_ids)
+        candidates = author_ids - existing
+        if not candidates:
+            return []
+        # Подписку, которую между чтением и вставкой добавили мимо
+        # follow_many (Follow.objects.create, загрузка), пропустит
+        # unique_follow вместо IntegrityError.
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=pk) for pk in candidates],
+            ignore_conflicts=True,
+        )
+        new_ids = sorted(_followed(user_id, candidates))
+        if not new_ids:
+            return []
+        timeline.add_authors(user_id, new_ids)
+        _after_change(user_id, new_ids, 1)
+        transaction.on_commit(partial(graph.add_edges, user_id, new_ids))
+    return new_ids
+
+
+def unfollow_many(user_id, author_ids):
+    """
+    Отписывает user_id от авторов author_ids одним удалением.
+    Возвращает id авторов, подписка на которых была.
+    """
+    author_ids = set(author_ids)
+    if not author_ids:
+        return []
+    with transaction.atomic():
+        _lock_follower(user_id)
+        removed = sorted(Follow.objects.select_for_update().filter(
+            user_id=user_id, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+        if not removed:
+            return []
+        # Обычный delete() отправил бы сигналы по каждой подписке,
+        # а здесь их работу делает _after_change.
+        follows = Follow.objects.filter(
+            user_id=user_id, author_id__in=removed
+        )
+        deleted = follows._raw_delete(follows.db)
+        timeline.remove_authors(user_id, removed)
+        if deleted == len(removed):
+            _after_change(user_id, removed, -1)
+        else:
+            # Строк удалено меньше, чем выбрано: какие именно - неизвестно,
+            # счётчики надёжнее пересчитать.
+            counters.recount_users([user_id, *removed])
+            _bump(user_id, removed)
+        transaction.on_commit(partial(graph.remove_edges, user_id, removed))
+    return removed
+
@@ -0,0 +1,83 @@
+"""
+Кэш отрисованных постов лент.
+
+Ленты рисуют includes/article.html для каждого поста страницы. Готовый
+HTML поста хранится под ключом из его id и версий поста, автора и
+группы (post_scope, user_scope, group_info_scope), поэтому правка
+поста, новый комментарий, готовая миниатюра или новое имя автора
+сбрасывают только фрагменты этого поста или автора. Фрагменты всей
+страницы читаются одним get_many, рисуются только недостающие.
+"""
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from core.cache import Namespace
+
+from . import cache as feed_cache
+
+TEMPLATE = 'includes/article.html'
+
+articles = Namespace('article')
+
+
+def page_variant(context):
+    """
+    Часть ключа от страницы: article.html не ставит ссылку на автора
+    в его профиле и показывает ссылку на группу по show_group_link.
+    """
+    match = getattr(context.get('request'), 'resolver_match', None)
+    view_name = match.view_name if match else ''
+    return f'{view_name}:{int(bool(context.get("show_group_link")))}'
+
+
+def post_scopes(post):
+    scopes = [
+        feed_cache.post_scope(post.pk),
+        feed_cache.user_scope(post.author_id),
+    ]
+    if post.group_id:
+        scopes.append(feed_cache.group_info_scope(post.group_id))
+    return scopes
+
+
+def article_keys(posts, variant):
+    """Ключи фрагментов постов; версии всех областей читаются разом."""
+    scopes = {post.pk: post_scopes(post) for post in posts}
+    names = list(dict.fromkeys(
+        scope for found in scopes.values() for scope in found
+    ))
+    tokens = dict(zip(names, feed_cache.get_versions(*names)))
+    return {
+        post.pk: '{}:{}:{}'.format(
+            post.pk,
+            '.'.join(tokens[scope] for scope in scopes[post.pk]),
+            variant,
+        )
+        for post in posts
+    }
+
+
+def render_articles(context, posts):
+    """
+    Пары (пост, HTML) в порядке страницы. Недостающие фрагменты
+    рисуются в текущем контексте шаблона, как {% include %}.
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+    # С реплики - отдельные ключи и короткий срок, как у фрагментов лент.
+    replica, timeout = feed_cache.replica_params(
+        '', settings.FEED_CACHE_TIMEOUT
+    )
+    keys = article_keys(posts, page_variant(context) + replica)
+    found = articles.get_many(keys.values())
+    missing = {}
+    template = context.template.engine.get_template(TEMPLATE)
+    for post in posts:
+        if keys[post.pk] not in found:
+            with context.push(post=post):
+                missing[keys[post.pk]] = template.render(context)
+    if missing:
+        articles.set_many(missing, timeout)
+        found.update(missing)
+    return [(post, mark_safe(found[keys[post.pk]])) for post in posts]
@@ -0,0 +1,259 @@
+"""
+Граф подписок в кэше.
+
+Для каждого пользователя кэш хранит два отсортированных массива id:
+на кого он подписан (FOLLOWING) и кто подписан на него (FOLLOWERS).
+Массив лежит байтами array('q'), 8 байт на подписку, а проверки
+и вставки идут бинарным поиском. Сигналы Follow после коммита
+дополняют массивы обоих пользователей на месте, массив, которого нет
+в кэше, читается из основной БД при первом обращении.
+
+Ключ массива содержит поколение, которое меняется при каждом изменении
+подписок пользователя. Читатель, загрузивший массив до коммита чужой
+подписки, положит его под старым поколением, и его никто не прочтёт.
+
+Подсказки "на кого подписаться" ранжируют друзей друзей по тем же
+массивам, без обхода таблицы Follow.
+"""
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from core.cache import Namespace, new_token
+
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+# Направление: чей id ищется в Follow и чей id попадает в массив.
+COLUMNS = {
+    FOLLOWING: ('user_id', 'author_id'),
+    FOLLOWERS: ('author_id', 'user_id'),
+}
+
+graph_cache = Namespace('graph')
+
+
+def _key(direction, user_id):
+    return f'{direction}:{user_id}'
+
+
+def _generation_key(key):
+    return f'generation:{key}'
+
+
+def _generations(keys):
+    """Текущие поколения массивов {key: token}, недостающие создаются."""
+    generation_keys = {_generation_key(key): key for key in keys}
+    found = graph_cache.get_many(generation_keys)
+    missing = [key for key in generation_keys if key not in found]
+    if missing:
+        for key in missing:
+            graph_cache.add(key, new_token(), None)
+        found.update(graph_cache.get_many(missing))
+    return {
+        generation_keys[key]: generation for key, generation in found.items()
+    }
+
+
+def _versioned_key(direction, user_id, generations):
+    key = _key(direction, user_id)
+    return f'{key}:{generations[key]}'
+
+
+def _unpack(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return ids
+
+
+def contains(ids, user_id):
+    """Есть ли user_id в отсортированном массиве ids."""
+    index = bisect_left(ids, user_id)
+    return index < len(ids) and ids[index] == user_id
+
+
+def _load(direction, user_ids):
+    """
+    Массивы из основной БД одним запросом: копия с реплики могла бы
+    застрять в кэше со старыми подписками.
+    """
+    owner, other = COLUMNS[direction]
+    found = defaultdict(list)
+    rows = Follow.objects.using(DEFAULT_DB_ALIAS).filter(
+        **{f'{owner}__in': user_ids}
+    ).values_list(owner, other)
+    for user_id, other_id in rows.iterator():
+        found[user_id].append(other_id)
+    return {
+        user_id: array('q', sorted(found[user_id])) for user_id in user_ids
+    }
+
+
+def adjacencies(direction, user_ids):
+    """Массивы соседей нескольких пользователей: {user_id: array}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+    generations = _generations(
+        _key(direction, user_id) for user_id in user_ids
+    )
+    keys = {
+        _versioned_key(direction, user_id, generations): user_id
+        for user_id in user_ids
+    }
+    cached = graph_cache.get_many(keys)
+    found = {keys[key]: _unpack(data) for key, data in cached.items()}
+    missing = [user_id for user_id in user_ids if user_id not in found]
+    if missing:
+        # Поколения прочитаны до загрузки: если подписка изменится
+        # между ними, массив ляжет под устаревший ключ.
+        loaded = _load(direction, missing)
+        graph_cache.set_many(
+            {
+                _versioned_key(direction, user_id, generations): ids.tobytes()
+                for user_id, ids in loaded.items()
+            },
+            settings.GRAPH_CACHE_TIMEOUT,
+        )
+        found.update(loaded)
+    return found
+
+
+def following(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    return adjacencies(FOLLOWING, [user_id])[user_id]
+
+
+def followers(user_id):
+    """Отсортированный массив id подписчиков user_id."""
+    return adjacencies(FOLLOWERS, [user_id])[user_id]
+
+
+def follower_count(user_id):
+    return len(followers(user_id))
+
+
+def following_count(user_id):
+    return len(following(user_id))
+
+
+def is_following(user_id, author_id):
+    return contains(following(user_id), author_id)
+
+
+def is_mutual(user_id, other_id):
+    """Подписаны ли пользователи друг на друга."""
+    found = adjacencies(FOLLOWING, [user_id, other_id])
+    return (
+        contains(found[user_id], other_id)
+        and contains(found[other_id], user_id)
+    )
+
+
+def suggestions(user_id, limit=None):
+    """
+    Кого предложить в подписки: авторы, на которых подписаны авторы
+    пользователя, по числу таких общих связей, при равенстве - по id.
+    Из подписок берутся не больше GRAPH_SUGGESTION_SOURCES авторов
+    с наибольшими id.
+    """
+    limit = limit or settings.GRAPH_SUGGESTIONS
+    followed = following(user_id)
+    sources = followed[-settings.GRAPH_SUGGESTION_SOURCES:]
+    scores = Counter()
+    for ids in adjacencies(FOLLOWING, sources).values():
+        for candidate in ids:
+            if candidate != user_id and not contains(followed, candidate):
+                scores[candidate] += 1
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [candidate for candidate, _ in ranked[:limit]]
+
+
+def _locked(key):
+    """
+    Лок на изменение массива: два воркера, дополнив его одновременно,
+    потеряли бы одну из подписок.
+    """
+    deadline = time.monotonic() + settings.GRAPH_LOCK_TIMEOUT
+    while not graph_cache.add(
+        f'lock:{key}', True, settings.GRAPH_LOCK_TIMEOUT
+    ):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(settings.GRAPH_LOCK_POLL_INTERVAL)
+    return True
+
+
+def _change(direction, user_id, other_ids, add):
+    key = _key(direction, user_id)
+    if not _locked(key):
+        # Массив перечитается из БД при следующем обращении.
+        graph_cache.set(_generation_key(key), new_token(), None)
+        return
+    try:
+        generation = _generations([key])[key]
+        data = graph_cache.get(f'{key}:{generation}')
+        generation = new_token()
+        if data is not None:
+            ids = _unpack(data)
+            for other_id in other_ids:
+                index = bisect_left(ids, other_id)
+                present = index < len(ids) and ids[index] == other_id
+                if add and not present:
+                    ids.insert(index, other_id)
+                elif not add and present:
+                    del ids[index]
+            graph_cache.set(
+                f'{key}:{generation}', ids.tobytes(),
+                settings.GRAPH_CACHE_TIMEOUT,
+            )
+        graph_cache.set(_generation_key(key), generation, None)
+    finally:
+        graph_cache.delete(f'lock:{key}')
+
+
+def _change_edges(user_id, author_ids, add):
+    author_ids = list(author_ids)
+    if not author_ids:
+        return
+    _change(FOLLOWING, user_id, author_ids, add)
+    # Массивы подписчиков, которых нет в кэше, менять не нужно, но
+    # поколение меняется у всех: их может загружать читатель.
+    generations = _generations(
+        _key(FOLLOWERS, author_id) for author_id in author_ids
+    )
+    cached = graph_cache.get_many(
+        f'{key}:{generation}' for key, generation in generations.items()
+    )
+    stale = {}
+    for author_id in author_ids:
+        if _versioned_key(FOLLOWERS, author_id, generations) in cached:
+            _change(FOLLOWERS, author_id, [user_id], add)
+        else:
+            stale[_generation_key(_key(FOLLOWERS, author_id))] = new_token()
+    graph_cache.set_many(stale, None)
+
+
+def add_edge(user_id, author_id):
+    """Подписка user_id на author_id."""
+    add_edges(user_id, [author_id])
+
+
+def add_edges(user_id, author_ids):
+    """Подписки user_id на несколько авторов сразу."""
+    _change_edges(user_id, author_ids, add=True)
+
+
+def remove_edge(user_id, author_id):
+    """Отписка user_id от author_id."""
+    remove_edges(user_id, [author_id])
+
+
+def remove_edges(user_id, author_ids):
+    _change_edges(user_id, author_ids, add=False)
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает БД параллельными процессами: писатели создают посты, '
+        'читатели открывают главную страницу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Длительность нагрузки в секундах.',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Файл для результатов в JSON.',
+        )
+
+    def handle(self, *args, **options):
+        result = benchmark.concurrency(
+            writers=options['writers'],
+            readers=options['readers'],
+            duration=options['duration'],
+        )
+        for role, summary in result['results'].items():
+            self.stdout.write(
+                f'{role:<8} {summary["per_second"]:>8.1f} запросов/с '
+                f'медиана {summary.get("median_ms", 0):>8.1f} мс '
+                f'p95 {summary.get("p95_ms", 0):>8.1f} мс '
+                f'ошибок {summary["errors"]:>4}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(result, stream, ensure_ascii=False, indent=2)
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеряет задержки и число запросов представлений ленты.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='Файл для результатов в JSON.',
+        )
+        parser.add_argument(
+            '--compare',
+            default=None,
+            help='JSON прошлого прогона для сравнения.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Допустимый рост медианы задержки, доля.',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument(
+            '--deep-page',
+            type=int,
+            default=None,
+            help='Номер глубокой страницы. По умолчанию - последняя.',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+
+    def handle(self, *args, **options):
+        result = benchmark.run(
+            repeat=options['repeat'],
+            warmup=options['warmup'],
+            cold=options['cold'],
+            deep_page=options['deep_page'],
+        )
+        for name, timing in result['results'].items():
+            self.stdout.write(
+                f'{name:<20} {timing["median_ms"]:>10.1f} мс '
+                f'p95 {timing["p95_ms"]:>10.1f} мс '
+                f'запросов {timing["queries"]:>4}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(result, stream, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                previous = json.load(stream)
+            lines, regressed = benchmark.compare(
+                previous, result, options['threshold']
+            )
+            for line in lines:
+                self.stdout.write(line)
+            if regressed:
+                raise CommandError('Замеры хуже прошлого прогона.')
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Показывает планы запросов лент с индексами под них и без них.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести результат в JSON.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            plans = benchmark.query_plans(options['repeat'])
+        except NotSupportedError as error:
+            raise CommandError(error)
+        if options['json']:
+            self.stdout.write(json.dumps(plans, ensure_ascii=False, indent=2))
+            return
+        for name, variants in plans.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for variant, title in (
+                ('without', 'без индексов'), ('with', 'с индексами')
+            ):
+                data = variants[variant]
+                self.stdout.write(f'  {title}: {data["ms"]} мс')
+                for line in data['plan']:
+                    self.stdout.write(f'    {line}')
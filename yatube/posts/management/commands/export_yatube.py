@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Файл выгрузки. По умолчанию - стандартный вывод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=transfer.FORMATS,
+            default=None,
+            help='Формат. По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=transfer.MODELS,
+            default=transfer.MODELS,
+            help='Какие модели выгружать.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из БД за раз.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        started = time.monotonic()
+        if path == '-':
+            exported = transfer.export(
+                self.stdout, format, options['models'], options['chunk_size']
+            )
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as stream:
+                exported = transfer.export(
+                    stream, format, options['models'], options['chunk_size']
+                )
+        self.stderr.write('Выгружено ' + transfer.throughput(
+            exported, time.monotonic() - started
+        ))
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии и подписки из JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл выгрузки или "-" для стандартного ввода.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=transfer.FORMATS,
+            default=None,
+            help='Формат. По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки bulk_create и транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        started = time.monotonic()
+        if path == '-':
+            importer = transfer.load(sys.stdin, format, options['batch_size'])
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                importer = transfer.load(
+                    stream, format, options['batch_size']
+                )
+        self.stdout.write('Загружено ' + transfer.throughput(
+            importer.imported, time.monotonic() - started
+        ))
+        if sum(importer.skipped.values()):
+            self.stdout.write(
+                'Пропущено уже существующих или ссылающихся на '
+                'отсутствующие записи: ' + ', '.join(
+                    f'{model}: {count}'
+                    for model, count in importer.skipped.items() if count
+                )
+            )
+        transfer.finish(importer)
+        self.stdout.write(self.style.SUCCESS(
+            'Счётчики, ленты подписок и кэш лент обновлены'
+        ))
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames',
+            nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать. '
+                 'По умолчанию - все.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Размер пачки для bulk_create.',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Только доложить в ленты посты авторов, переставших '
+                 'быть популярными. Удобно запускать по расписанию.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['backfill']:
+            self.rebuild(options)
+        authors, entries = timeline.backfill(
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Доложено постов бывших популярных авторов: {authors}, '
+            f'записей: {entries}'
+        ))
+
+    def rebuild(self, options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(
+                User.objects.filter(
+                    username__in=options['usernames']
+                ).values_list('id', flat=True)
+            )
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Не все пользователи найдены.')
+        users, entries = timeline.rebuild(
+            user_ids, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано лент: {users}, записей: {entries}'
+        ))
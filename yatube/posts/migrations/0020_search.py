@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from posts.search import get_index
+
+
+def create_index(apps, schema_editor):
+    index = get_index(schema_editor.connection)
+    if index is not None:
+        with schema_editor.connection.cursor() as cursor:
+            index.create(cursor)
+            index.fill(cursor)
+
+
+def drop_index(apps, schema_editor):
+    index = get_index(schema_editor.connection)
+    if index is not None:
+        with schema_editor.connection.cursor() as cursor:
+            index.drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_thumbnailtask'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='fanout_skipped',
+            field=models.BooleanField(default=False, verbose_name='Посты не разложены по лентам'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 22:10
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_fanout_skipped_since(apps, schema_editor):
+    # Когда автор стал популярным, неизвестно: доложить все его посты.
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.using(schema_editor.connection.alias).filter(
+        fanout_skipped=True
+    ).update(fanout_skipped_since=datetime(1970, 1, 1, tzinfo=timezone.utc))
+
+
+def fill_pub_date(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.using(schema_editor.connection.alias).update(
+        pub_date=Subquery(
+            Post.objects.filter(pk=OuterRef('post_id')).values('pub_date')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_thumbnailtask_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='fanout_skipped_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Посты не разложены по лентам с'),
+        ),
+        migrations.RunPython(
+            fill_fanout_skipped_since, migrations.RunPython.noop
+        ),
+        migrations.RemoveField(
+            model_name='userstats',
+            name='fanout_skipped',
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='Дата публикации'),
+        ),
+        migrations.RunPython(fill_pub_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='Дата публикации'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_date_idx'),
+        ),
+    ]
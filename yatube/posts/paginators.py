@@ -0,0 +1,189 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from core.cache import Namespace
+
+counts = Namespace('paginator')
+
+# Целые в курсоре вне диапазона BIGINT СУБД не примет и ответит
+# OverflowError уже при выполнении запроса.
+MAX_CURSOR_INT = 2 ** 63 - 1
+
+
+class ApproximateCountMixin:
+    """
+    Приблизительный подсчёт объектов.
+
+    Вместо COUNT(*) на каждый запрос берёт количество из кэша
+    и пересчитывает его не чаще, чем раз в PAGINATOR_COUNT_TIMEOUT секунд.
+    """
+
+    def __init__(self, *args, approximate_count=False, **kwargs):
+        self.approximate_count = approximate_count
+        super().__init__(*args, **kwargs)
+
+    def exact_count(self):
+        return Paginator.count.func(self)
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return self.exact_count()
+        try:
+            query = str(self.object_list.query)
+        except (AttributeError, EmptyResultSet):
+            return self.exact_count()
+        key = 'count:' + hashlib.md5(query.encode()).hexdigest()
+        return counts.get_or_set(
+            key, self.exact_count, settings.PAGINATOR_COUNT_TIMEOUT
+        )
+
+
+class FeedPaginator(ApproximateCountMixin, Paginator):
+    """Постраничная навигация по номеру страницы (?page=)."""
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: знает соседей, но не свой номер."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    @property
+    def is_cursor(self):
+        return True
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(ApproximateCountMixin, Paginator):
+    """
+    Курсорная (keyset) пагинация.
+
+    Вместо OFFSET продолжает выборку от последнего показанного объекта
+    по ключу сортировки, поэтому глубокие страницы стоят столько же,
+    сколько первая. Курсор - непрозрачная строка для параметра ?cursor=.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, ordering=None, **kwargs):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+
+    @property
+    def field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def field(self, name):
+        """Поле модели или аннотации queryset по имени из ordering."""
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def cursor_value(self, obj, name):
+        """Значение ключа для курсора; obj - модель или словарь values()."""
+        if isinstance(obj, dict):
+            value = obj[name]
+        elif name in self.object_list.query.annotations:
+            value = getattr(obj, name)
+        else:
+            return self.field(name).value_to_string(obj)
+        return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+    def encode_cursor(self, obj, reverse=False):
+        values = [self.cursor_value(obj, name) for name in self.field_names]
+        data = json.dumps([int(reverse)] + values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (значения ключа, направление) или (None, False)."""
+        if not cursor:
+            return None, False
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            reverse, *values = json.loads(
+                base64.urlsafe_b64decode(cursor + padding).decode()
+            )
+            if len(values) != len(self.ordering):
+                return None, False
+            fields = [self.field(name) for name in self.field_names]
+            values = [
+                field.to_python(value)
+                for field, value in zip(fields, values)
+            ]
+        except (
+            ValueError, TypeError, OverflowError, binascii.Error,
+            ValidationError,
+        ):
+            return None, False
+        if any(
+            isinstance(value, int) and abs(value) > MAX_CURSOR_INT
+            for value in values
+        ):
+            return None, False
+        return values, bool(reverse)
+
+    def seek(self, values, reverse=False):
+        """Условие "строго после values" в порядке сортировки."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            lookup = '{}__{}'.format(
+                field.lstrip('-'), 'lt' if descending else 'gt'
+            )
+            equal = dict(zip(self.field_names[:index], values[:index]))
+            condition |= Q(**equal, **{lookup: values[index]})
+        return condition
+
+    def get_cursor_page(self, cursor=None):
+        """
+        Возвращает страницу после курсора.
+        Неверный или пустой курсор ведёт на первую страницу.
+        """
+        values, reverse = self.decode_cursor(cursor)
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self.seek(values, reverse))
+        if reverse:
+            queryset = queryset.reverse()
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        del items[self.per_page:]
+        if reverse:
+            items.reverse()
+        has_next = values is not None if reverse else has_more
+        has_previous = has_more if reverse else values is not None
+        return CursorPage(
+            items,
+            self,
+            next_cursor=(
+                self.encode_cursor(items[-1])
+                if has_next and items else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(items[0], reverse=True)
+                if has_previous and items else None
+            ),
+        )
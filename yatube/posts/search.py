@@ -0,0 +1,252 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+Индекс хранится в отдельной таблице posts_search: на SQLite это
+виртуальная таблица FTS5, на PostgreSQL - колонка tsvector с GIN-индексом.
+Таблицу создаёт миграция 0020_search, сигналы обновляют её при сохранении
+и удалении постов и комментариев. На остальных СУБД поиск идёт через
+icontains без индекса.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+POST = 'post'
+COMMENT = 'comment'
+
+WORD_RE = re.compile(r'\w+')
+
+
+def terms(query):
+    """Слова поискового запроса."""
+    return WORD_RE.findall(query.lower())
+
+
+class SQLiteIndex:
+    """
+    FTS5. Вид записи зашит в rowid (чётные - посты, нечётные -
+    комментарии), поэтому обновление и удаление идут по первичному ключу.
+    """
+
+    def rowid(self, kind, pk):
+        return pk * 2 + (kind == COMMENT)
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+            "text, post_id UNINDEXED, tokenize='unicode61')"
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def fill(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, post_id) '
+            f'SELECT id * 2, text, id FROM {Post._meta.db_table}'
+        )
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, text, post_id) '
+            f'SELECT id * 2 + 1, text, post_id FROM {Comment._meta.db_table}'
+        )
+
+    def add(self, cursor, kind, entries):
+        self.remove(cursor, kind, [pk for pk, _, _ in entries])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, text, post_id) VALUES (%s, %s, %s)',
+            [
+                (self.rowid(kind, pk), text, post_id)
+                for pk, post_id, text in entries
+            ],
+        )
+
+    def remove(self, cursor, kind, pks):
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(self.rowid(kind, pk),) for pk in pks],
+        )
+
+    def match(self, cursor, words, kind=None):
+        query = ' '.join(f'"{word}"*' for word in words)
+        sql = f'SELECT rowid, post_id FROM {TABLE} WHERE {TABLE} MATCH %s'
+        params = [query]
+        if kind is not None:
+            sql += ' AND rowid %% 2 = %s'
+            params.append(int(kind == COMMENT))
+        cursor.execute(sql + ' ORDER BY rank', params)
+        for rowid, post_id in cursor:
+            yield (COMMENT if rowid % 2 else POST), rowid // 2, post_id
+
+
+class PostgresIndex:
+    """tsvector с GIN-индексом, ранжирование через ts_rank."""
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE {TABLE} ('
+            'kind varchar(7) NOT NULL, '
+            'object_id integer NOT NULL, '
+            'post_id integer NOT NULL, '
+            'document tsvector NOT NULL, '
+            'PRIMARY KEY (kind, object_id))'
+        )
+        cursor.execute(
+            f'CREATE INDEX {TABLE}_document ON {TABLE} USING GIN (document)'
+        )
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def fill(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for kind, model, post_field in (
+            (POST, Post, 'id'), (COMMENT, Comment, 'post_id')
+        ):
+            cursor.execute(
+                f'INSERT INTO {TABLE} (kind, object_id, post_id, document) '
+                f'SELECT %s, id, {post_field}, to_tsvector(%s, text) '
+                f'FROM {model._meta.db_table}',
+                [kind, settings.SEARCH_CONFIG],
+            )
+
+    def add(self, cursor, kind, entries):
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (kind, object_id, post_id, document) '
+            'VALUES (%s, %s, %s, to_tsvector(%s, %s)) '
+            'ON CONFLICT (kind, object_id) DO UPDATE '
+            'SET post_id = EXCLUDED.post_id, document = EXCLUDED.document',
+            [
+                (kind, pk, post_id, settings.SEARCH_CONFIG, text)
+                for pk, post_id, text in entries
+            ],
+        )
+
+    def remove(self, cursor, kind, pks):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = ANY(%s)',
+            [kind, list(pks)],
+        )
+
+    def match(self, cursor, words, kind=None):
+        query = ' & '.join(f"'{word}':*" for word in words)
+        sql = (
+            f'SELECT kind, object_id, post_id '
+            f'FROM {TABLE}, to_tsquery(%s, %s) q '
+            'WHERE document @@ q'
+        )
+        params = [settings.SEARCH_CONFIG, query]
+        if kind is not None:
+            sql += ' AND kind = %s'
+            params.append(kind)
+        cursor.execute(sql + ' ORDER BY ts_rank(document, q) DESC', params)
+        yield from cursor
+
+
+INDEXES = {
+    'sqlite': SQLiteIndex,
+    'postgresql': PostgresIndex,
+}
+
+
+def get_index(using=None):
+    """Индекс для СУБД соединения или None, если она не поддерживается."""
+    index = INDEXES.get((using or connection).vendor)
+    return index() if index else None
+
+
+def _fallback(words, kind):
+    """Поиск без индекса: все слова через icontains."""
+    condition = Q()
+    for word in words:
+        condition &= Q(text__icontains=word)
+    found = []
+    if kind in (None, POST):
+        found.extend(
+            (POST, pk, pk)
+            for pk in Post.objects.filter(
+                condition
+            ).values_list('pk', flat=True)
+        )
+    if kind in (None, COMMENT):
+        found.extend(
+            (COMMENT, pk, post_id)
+            for pk, post_id in Comment.objects.filter(
+                condition
+            ).values_list('pk', 'post_id')
+        )
+    return found
+
+
+def match(query, kind=None):
+    """Записи индекса (вид, pk, pk поста) в порядке релевантности."""
+    words = terms(query)
+    if not words:
+        return
+    index = get_index()
+    if index is None:
+        yield from _fallback(words, kind)
+        return
+    with connection.cursor() as cursor:
+        yield from index.match(cursor, words, kind)
+
+
+def search_ids(query, kind, limit=None):
+    """Найденные pk постов или комментариев, лучшие первыми."""
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    found = []
+    for _, pk, _ in match(query, kind):
+        found.append(pk)
+        if len(found) >= limit:
+            break
+    return found
+
+
+def search_post_ids(query, limit=None):
+    """
+    Найденные pk постов, лучшие первыми.
+    Пост находится и по собственному тексту, и по своим комментариям.
+    """
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    found = {}
+    for _, _, post_id in match(query):
+        found.setdefault(post_id, None)
+        if len(found) >= limit:
+            break
+    return list(found)
+
+
+def index_objects(kind, objects):
+    """Добавляет или обновляет в индексе посты либо комментарии."""
+    index = get_index()
+    if index is None:
+        return
+    entries = [
+        (obj.pk, obj.pk if kind == POST else obj.post_id, obj.text)
+        for obj in objects
+    ]
+    with connection.cursor() as cursor:
+        index.add(cursor, kind, entries)
+
+
+def remove_objects(kind, pks):
+    """Удаляет из индекса посты либо комментарии."""
+    index = get_index()
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.remove(cursor, kind, pks)
+
+
+def rebuild():
+    """Перестраивает индекс по таблицам постов и комментариев."""
+    index = get_index()
+    if index is None:
+        return
+    with connection.cursor() as cursor:
+        index.fill(cursor)
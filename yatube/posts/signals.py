@@ -0,0 +1,226 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache as feed_cache
+from . import counters, graph, search, thumbnails, timeline
+from .models import (
+    Comment, Follow, Group, Post, Tombstone, User, UserStats,
+)
+
+
+# Счётчики обновляются раньше, чем сигналы ниже меняют версии кэша:
+# приёмники вызываются в порядке регистрации, а фрагменты под новой
+# версией должны рисоваться уже с новыми числами.
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user_stats(instance.user_id, following_count=1)
+        counters.change_user_stats(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user_stats(instance.user_id, following_count=-1)
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_posts(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_posts(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
+
+
+# Граф меняется после коммита: иначе читатель успел бы положить в кэш
+# массив без этой подписки уже после изменения.
+@receiver(post_save, sender=Follow)
+def add_graph_edge(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        transaction.on_commit(
+            partial(graph.add_edge, instance.user_id, instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def remove_graph_edge(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(graph.remove_edge, instance.user_id, instance.author_id)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image')
+            .first()
+        ) or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def enqueue_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image.name != getattr(
+        instance, '_previous_image', None
+    ):
+        thumbnails.enqueue(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump(
+        feed_cache.post_scope(instance.pk),
+        *feed_cache.post_scopes(
+            instance.author_id,
+            instance.group_id,
+            getattr(instance, '_previous_group_id', None),
+        ),
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post_feeds(sender, instance, **kwargs):
+    post = Post.objects.filter(
+        pk=instance.post_id
+    ).values('author_id', 'group_id').first()
+    if post is not None:
+        feed_cache.bump(
+            feed_cache.post_scope(instance.post_id),
+            *feed_cache.post_scopes(post['author_id'], post['group_id']),
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    feed_cache.bump(
+        feed_cache.ALL,
+        feed_cache.group_scope(instance.pk),
+        feed_cache.group_info_scope(instance.pk),
+    )
+
+
+# Поля пользователя, которые показываются в лентах и на страницах постов.
+FEED_USER_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_user_names(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    instance._previous_names = None
+    if instance.pk and not raw and (
+        update_fields is None or set(update_fields) & set(FEED_USER_FIELDS)
+    ):
+        instance._previous_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*FEED_USER_FIELDS).first()
+
+
+def _bump_user_scopes(user_id):
+    feed_cache.bump(
+        feed_cache.ALL,
+        feed_cache.USERS,
+        feed_cache.author_scope(user_id),
+        feed_cache.user_scope(user_id),
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_feeds(sender, instance, created, raw=False, **kwargs):
+    # У нового пользователя ещё нет ничего, что показывалось бы в лентах.
+    if created or raw:
+        return
+    previous = getattr(instance, '_previous_names', None)
+    names = tuple(getattr(instance, field) for field in FEED_USER_FIELDS)
+    if previous is not None and previous != names:
+        _bump_user_scopes(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user_feeds(sender, instance, **kwargs):
+    _bump_user_scopes(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump(
+        feed_cache.follow_scope(instance.user_id),
+        feed_cache.followers_scope(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_objects(search.POST, [instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_objects(search.POST, [instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_objects(search.COMMENT, [instance])
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove_objects(search.COMMENT, [instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.POST, object_id=instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def remember_deleted_comment(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=Tombstone.COMMENT, object_id=instance.pk)
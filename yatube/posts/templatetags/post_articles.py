@@ -0,0 +1,11 @@
+from django import template
+
+from posts.fragments import render_articles
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_articles(context, posts):
+    """Пары (пост, HTML) страницы из кэша фрагментов."""
+    return render_articles(context, posts)
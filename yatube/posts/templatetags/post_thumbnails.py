@@ -0,0 +1,21 @@
+import logging
+
+from django import template
+
+from posts.thumbnails import post_thumbnail as get_post_thumbnail
+
+register = template.Library()
+logger = logging.getLogger(__name__)
+
+
+@register.simple_tag(takes_context=True)
+def post_thumbnail(context, image):
+    """
+    Миниатюра картинки поста: готовая или оригинал до нарезки.
+    Берёт миниатюры, загруженные пакетом для всей страницы (thumbnails).
+    """
+    try:
+        return get_post_thumbnail(image, context.get('thumbnails'))
+    except Exception:
+        logger.exception('Thumbnail lookup failed for %s', image)
+        return None
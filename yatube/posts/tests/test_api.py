@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(NUMBER_OF_POSTS=2)
+class ReadAPITests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group
+            )
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, *args, **params):
+        return self.client.get(reverse(f'posts:{name}', args=args), params)
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсор проходит ленту по порядку без повторов"""
+        found = []
+        cursor = ''
+        while True:
+            data = self.get('api_index', cursor=cursor).json()
+            found.extend(post['id'] for post in data['results'])
+            if data['next'] is None:
+                break
+            cursor = data['next']
+        self.assertEqual(found, [post.pk for post in reversed(self.posts)])
+
+    def test_fields_selection(self):
+        """?fields= оставляет только выбранные поля"""
+        data = self.get('api_group_list', 'group', fields='id,author').json()
+        self.assertEqual(data['group']['title'], 'Группа')
+        self.assertEqual(
+            data['results'][0],
+            {'id': self.posts[-1].pk, 'author': 'author'},
+        )
+        response = self.get('api_index', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rows_are_not_instantiated(self):
+        """Посты сериализуются без создания моделей"""
+        with mock.patch.object(Post, 'from_db') as from_db:
+            self.get('api_profile', 'author')
+        from_db.assert_not_called()
+
+    def test_post_detail_with_comments(self):
+        """Пост отдаётся с первой порцией комментариев"""
+        data = self.get('api_post_detail', self.posts[0].pk).json()
+        self.assertEqual(data['post']['text'], 'Пост 0')
+        self.assertIsNone(data['post']['image'])
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']['results']],
+            ['Комментарий'],
+        )
+        response = self.get('api_post_detail', 0)
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок доступна только вошедшему пользователю"""
+        self.assertEqual(self.get('api_follow_index').status_code, 401)
+        self.client.force_login(self.reader)
+        data = self.get('api_follow_index', fields='id').json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(self.get('api_profile', 'nobody').status_code, 404)
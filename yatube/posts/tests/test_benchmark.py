@@ -0,0 +1,72 @@
+import copy
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Group, Post, TimelineEntry, User
+
+
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed_and_run(self):
+        """Генератор наполняет БД, замеры открывают все представления"""
+        created = benchmark.seed(
+            users=10, posts=40, groups=2, comments=20,
+            follows_per_user=2, seed=1,
+        )
+        self.assertEqual(User.objects.count(), created['user'])
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertTrue(TimelineEntry.objects.exists())
+        result = benchmark.run(repeat=1, warmup=0, deep_page=2)
+        self.assertEqual(result['dataset']['posts'], 40)
+        self.assertEqual(
+            {name.split(':')[0] for name in result['results']},
+            {
+                'index', 'group_posts', 'profile',
+                'follow_index', 'post_detail',
+            },
+        )
+        for timing in result['results'].values():
+            self.assertEqual(timing['status'], 200)
+            self.assertGreaterEqual(timing['queries'], 0)
+        slower = copy.deepcopy(result)
+        slower['results']['index:first']['queries'] += 1
+        _, regressed = benchmark.compare(result, slower)
+        self.assertTrue(regressed)
+        _, regressed = benchmark.compare(result, result)
+        self.assertFalse(regressed)
+
+    def test_query_plans_show_feed_indexes(self):
+        """Планы лент используют индексы и меняются без них"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Планы сравниваются на SQLite')
+        author = User.objects.create_user(username='author')
+        group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=author, group=group, text='Пост')
+        plans = benchmark.query_plans(repeat=1)
+        for name, index in (
+            ('group_posts:page', 'post_group_pub_date_idx'),
+            ('profile:cursor', 'post_author_pub_date_idx'),
+        ):
+            self.assertIn(index, ' '.join(plans[name]['with']['plan']))
+            self.assertNotIn(index, ' '.join(plans[name]['without']['plan']))
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table
+            )
+        self.assertIn('post_group_pub_date_idx', indexes)
+
+    def test_query_plans_refuse_other_databases(self):
+        """Вне SQLite explain_feeds не удаляет индексы, а падает"""
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaises(CommandError):
+                call_command('explain_feeds')
+        self.assertEqual(connection.vendor, 'sqlite')
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(CHANGES_DELAY=0)
+class ChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.user, text='Комментарий'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('posts:changes')
+
+    def fetch(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def read_all(self, since='', limit=2):
+        found = []
+        while True:
+            data = self.fetch(since=since, limit=limit)
+            found.extend(
+                (change['model'], change['id']) for change in data['changes']
+            )
+            since = data['cursor']
+            if not data['has_more']:
+                return found, since
+
+    def test_feed_pages_without_gaps(self):
+        """Лента по курсору отдаёт все изменения по одному разу"""
+        found, _ = self.read_all()
+        self.assertEqual(found, [
+            *(('post', post.pk) for post in self.posts),
+            ('comment', self.comment.pk),
+        ])
+
+    def test_edit_and_delete_after_cursor(self):
+        """Правка и удаление после курсора попадают в ленту"""
+        _, cursor = self.read_all()
+        self.client.force_login(self.user)
+        post = self.posts[1]
+        before = post.updated_at
+        self.client.post(
+            reverse('posts:post_edit', args=(post.pk,)),
+            {'text': 'Исправленный пост'},
+        )
+        post.refresh_from_db()
+        self.assertGreater(post.updated_at, before)
+        deleted = self.posts[2].pk
+        Post.objects.filter(pk=deleted).delete()
+        data = self.fetch(since=cursor)
+        self.assertEqual(
+            [(change['model'], change['id']) for change in data['changes']],
+            [('post', post.pk), ('post', deleted)],
+        )
+        self.assertEqual(data['changes'][0]['text'], 'Исправленный пост')
+        self.assertIn('deleted_at', data['changes'][1])
+        self.assertEqual(self.fetch(since=data['cursor'])['changes'], [])
+
+    def test_since_timestamp(self):
+        """since принимает момент времени и проверяет курсор"""
+        since = self.comment.created.isoformat()
+        data = self.fetch(since=since)
+        self.assertEqual(
+            [change['id'] for change in data['changes']], [self.comment.pk]
+        )
+        response = self.client.get(self.url, {'since': 'мусор'})
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(CHANGES_DELAY=60)
+    def test_recent_changes_are_held_back(self):
+        """Свежие изменения выдаются только после задержки"""
+        self.assertEqual(self.fetch()['changes'], [])
+
+    def test_bad_limit_rejected(self):
+        """Неположительный или нечисловой limit отвечает 400"""
+        for limit in ('0', '-1', '-5', 'много'):
+            with self.subTest(limit=limit):
+                response = self.client.get(self.url, {'limit': limit})
+                self.assertEqual(response.status_code, 400)
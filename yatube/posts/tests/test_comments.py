@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentsPaginationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}'
+            )
+            for number in range(7)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_post_detail_shows_first_batch(self):
+        """Страница поста показывает только первую порцию комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:3])
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=(self.post.pk,))
+            + f'?cursor={page.next_cursor}',
+        )
+
+    def test_fragment_returns_next_batches(self):
+        """Фрагмент отдаёт следующие порции без повторов и пропусков"""
+        url = reverse('posts:post_comments', args=(self.post.pk,))
+        shown = []
+        cursor = ''
+        while True:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html'
+            )
+            page = response.context['comments']
+            shown.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(shown, self.comments)
+
+    def test_fragment_for_missing_post(self):
+        """Фрагмент несуществующего поста отвечает 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk + 1,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_comments_query_uses_index(self):
+        """Выборка комментариев поста идёт по индексу (post, created)"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План запроса проверяется на SQLite')
+        queryset = Comment.objects.filter(
+            post=self.post
+        ).order_by('created', 'id')[:4]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('comment_post_created_idx', plan)
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'], **headers
+        )
+
+    def test_unchanged_pages_answer_304(self):
+        """Неизменившиеся ленты и пост отвечают 304 без запросов лент"""
+        pages = {
+            reverse('posts:index'): 0,
+            reverse('posts:group_list', args=(self.group.slug,)): 1,
+            reverse('posts:profile', args=(self.author.username,)): 1,
+            reverse('posts:post_detail', args=(self.post.pk,)): 1,
+        }
+        for url, queries in pages.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(queries):
+                    repeated = self.revalidate(url, response)
+                self.assertEqual(repeated.status_code, 304)
+                repeated = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(repeated.status_code, 304)
+
+    def test_changes_invalidate_validators(self):
+        """Изменения на странице меняют её ETag"""
+        changes = {
+            reverse('posts:index'): lambda: Post.objects.create(
+                author=self.reader, text='Новый пост'
+            ),
+            reverse('posts:post_detail', args=(self.post.pk,)): (
+                lambda: Comment.objects.create(
+                    post=self.post, author=self.reader, text='Комментарий'
+                )
+            ),
+            reverse('posts:profile', args=(self.author.username,)): (
+                lambda: Follow.objects.create(
+                    user=self.reader, author=self.author
+                )
+            ),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                change()
+                self.assertEqual(
+                    self.revalidate(url, response).status_code, 200
+                )
+
+    def test_etag_depends_on_user(self):
+        """Другой пользователь получает страницу целиком"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
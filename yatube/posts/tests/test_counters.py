@@ -0,0 +1,91 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import cache as feed_cache
+from ..models import Comment, Follow, Post, UserStats
+from .utils import on_commit_hooks
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_and_follow_counters(self):
+        """Счётчики постов и подписок следуют за изменениями"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_counters_updated_before_cache_bump(self):
+        """Версии кэша меняются, когда счётчики уже обновлены"""
+        seen = []
+        bump = feed_cache.bump
+
+        def remember(*scopes):
+            seen.append(self.stats(self.author).posts_count)
+            bump(*scopes)
+
+        with mock.patch.object(feed_cache, 'bump', remember):
+            Post.objects.create(text='Пост', author=self.author)
+        self.assertEqual(seen, [1])
+
+    def test_bump_repeated_after_commit(self):
+        """Внутри транзакции версия меняется ещё раз после коммита"""
+        scope = feed_cache.author_scope(self.author.pk)
+        with on_commit_hooks():
+            feed_cache.bump(scope)
+            bumped = feed_cache.get_versions(scope)
+        self.assertNotEqual(feed_cache.get_versions(scope), bumped)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев следует за изменениями"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет расхождения"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        UserStats.objects.update(posts_count=42)
+        Post.objects.update(comments_count=42)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль показывает счётчик без COUNT(*) по постам"""
+        Post.objects.create(text='Пост', author=self.author)
+        response = Client().get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertEqual(response.context['author'].stats.posts_count, 1)
@@ -0,0 +1,157 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters, follows, graph, timeline
+from ..models import Follow, Post, TimelineEntry, UserStats
+from .utils import on_commit_hooks
+
+User = get_user_model()
+
+
+class FollowBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(10)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text=f'Пост {author}')
+        Follow.objects.create(user=cls.reader, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:api_following')
+
+    def post(self, data):
+        return self.client.post(
+            self.url, json.dumps(data), content_type='application/json'
+        )
+
+    def stats(self):
+        return list(UserStats.objects.order_by('user_id').values_list(
+            'user_id', 'followers_count', 'following_count'
+        ))
+
+    def assert_consistent(self):
+        before = self.stats()
+        counters.recount_users()
+        self.assertEqual(self.stats(), before)
+
+    def test_follow_batch(self):
+        """Пачка подписок: только новые, счётчики, лента и граф верны"""
+        graph.following(self.reader.pk)
+        with on_commit_hooks():
+            response = self.post({'follow': [
+                'author0', 'author1', 'author2', 'reader', 'nobody',
+            ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'followed': ['author1', 'author2'],
+            'unfollowed': [],
+            'unknown': ['nobody'],
+        })
+        self.assertEqual(
+            set(graph.following(self.reader.pk)),
+            {author.pk for author in self.authors[:3]},
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assert_consistent()
+        repeated = self.post({'follow': ['author1']})
+        self.assertEqual(repeated.json()['followed'], [])
+        self.assertEqual(
+            self.client.get(self.url).json(),
+            {'following': ['author0', 'author1', 'author2']},
+        )
+
+    def test_unfollow_batch(self):
+        """Пачка отписок одним удалением"""
+        follows.follow_many(
+            self.reader.pk, [author.pk for author in self.authors[:4]]
+        )
+        response = self.post({
+            'unfollow': ['author0', 'author2', 'author9'],
+            'follow': ['author5'],
+        })
+        self.assertEqual(response.json(), {
+            'followed': ['author5'],
+            'unfollowed': ['author0', 'author2'],
+            'unknown': [],
+        })
+        self.assertEqual(
+            sorted(Follow.objects.filter(
+                user=self.reader
+            ).values_list('author__username', flat=True)),
+            ['author1', 'author3', 'author5'],
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, post__author__username='author0'
+        ).exists())
+        self.assertFalse(graph.is_following(
+            self.reader.pk, self.authors[2].pk
+        ))
+        self.assert_consistent()
+
+    def test_concurrent_follow_does_not_fail(self):
+        """Подписка, вставленная между чтением и вставкой, не роняет пачку"""
+        followed = follows._followed
+
+        def insert_meanwhile(user_id, author_ids):
+            found = followed(user_id, author_ids)
+            if not Follow.objects.filter(
+                user=self.reader, author=self.authors[1]
+            ).exists():
+                Follow.objects.bulk_create([
+                    Follow(user=self.reader, author=self.authors[1])
+                ])
+            return found
+
+        with mock.patch.object(follows, '_followed', insert_meanwhile):
+            new_ids = follows.follow_many(
+                self.reader.pk, [self.authors[1].pk, self.authors[2].pk]
+            )
+        self.assertEqual(
+            new_ids, [self.authors[1].pk, self.authors[2].pk]
+        )
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.authors[1]
+        ).count(), 1)
+
+    def test_queries_do_not_grow_with_batch(self):
+        """Число запросов не зависит от размера пачки"""
+        counts = []
+        timeline.celebrity_ids()
+        for authors in (self.authors[1:3], self.authors[3:10]):
+            with CaptureQueriesContext(connection) as captured:
+                follows.follow_many(
+                    self.reader.pk, [author.pk for author in authors]
+                )
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bad_requests(self):
+        """Аноним получает 401, неверное тело и пересечение - 400"""
+        self.assertEqual(
+            self.post({'follow': 'author1'}).status_code, 400
+        )
+        self.assertEqual(self.post({
+            'follow': ['author1'], 'unfollow': ['author1'],
+        }).status_code, 400)
+        response = self.client.post(
+            self.url, 'не json', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post({'follow': ['author1']}).status_code, 401)
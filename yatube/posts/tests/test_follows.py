@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..follows import FollowSet
+from ..models import Follow, Post
+from .utils import on_commit_hooks
+
+User = get_user_model()
+
+
+class FollowSetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(5)
+        ]
+        for author in cls.authors[:3]:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_one_query_for_all_authors(self):
+        """Подписки на всех авторов страницы загружаются одним запросом"""
+        follows = FollowSet(self.reader)
+        with self.assertNumQueries(1):
+            answers = [follows.is_following(author) for author in self.authors]
+        self.assertEqual(answers, [True, True, True, False, False])
+        self.assertIn(self.authors[0].pk, follows)
+        with self.assertNumQueries(0):
+            self.assertTrue(FollowSet(self.reader).is_following(
+                self.authors[1]
+            ))
+
+    def test_follow_changes_invalidate_cache(self):
+        """Подписка и отписка сразу видны в новом запросе"""
+        FollowSet(self.reader).ids
+        with on_commit_hooks():
+            Follow.objects.create(user=self.reader, author=self.authors[4])
+            Follow.objects.filter(
+                user=self.reader, author=self.authors[0]
+            ).delete()
+        follows = FollowSet(self.reader)
+        self.assertTrue(follows.is_following(self.authors[4]))
+        self.assertFalse(follows.is_following(self.authors[0]))
+
+    def test_anonymous_follows_nobody(self):
+        """Аноним ни на кого не подписан и в БД не ходит"""
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                FollowSet(AnonymousUser()).is_following(self.authors[0])
+            )
+
+    def test_index_shows_follow_buttons(self):
+        """На главной у чужих постов кнопка подписки или отписки"""
+        for author in self.authors[2:4]:
+            Post.objects.create(author=author, text=f'Пост {author}')
+        Post.objects.create(author=self.reader, text='Свой пост')
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, reverse(
+            'posts:profile_unfollow', args=(self.authors[2].username,)
+        ))
+        self.assertContains(response, reverse(
+            'posts:profile_follow', args=(self.authors[3].username,)
+        ))
+        self.assertNotContains(response, reverse(
+            'posts:profile_follow', args=(self.reader.username,)
+        ))
+        with on_commit_hooks():
+            self.client.get(reverse(
+                'posts:profile_follow', args=(self.authors[3].username,)
+            ))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, reverse(
+            'posts:profile_unfollow', args=(self.authors[3].username,)
+        ))
@@ -0,0 +1,79 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import fragments
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ArticleFragmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for number in range(3):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def rendered(self, url):
+        """Сколько фрагментов постов пришлось нарисовать для страницы."""
+        with mock.patch.object(
+            fragments.articles, 'set_many',
+            wraps=fragments.articles.set_many,
+        ) as set_many:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if not set_many.called:
+            return 0, response
+        return len(set_many.call_args[0][0]), response
+
+    def test_new_post_renders_only_itself(self):
+        """После нового поста страница рисует только его"""
+        url = reverse('posts:index')
+        self.assertEqual(self.rendered(url)[0], 3)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        count, response = self.rendered(url)
+        self.assertEqual(count, 1)
+        self.assertContains(response, 'Свежий пост')
+        self.assertContains(response, 'Пост 0')
+
+    def test_changes_invalidate_fragment(self):
+        """Правка поста, комментарий и новое имя автора видны сразу"""
+        url = reverse('posts:index')
+        self.rendered(url)
+        post = Post.objects.latest('pk')
+        post.text = 'Исправленный пост'
+        post.save()
+        Comment.objects.create(post=post, author=self.author, text='Ок')
+        count, response = self.rendered(url)
+        self.assertEqual(count, 1)
+        self.assertContains(response, 'Исправленный пост')
+        self.assertContains(response, 'Комментариев: 1')
+        self.author.first_name = 'Лёва'
+        self.author.save()
+        count, response = self.rendered(url)
+        self.assertEqual(count, 3)
+        self.assertContains(response, 'Лёва Толстой')
+
+    def test_pages_keep_own_variants(self):
+        """Профиль не берёт фрагменты главной с другими ссылками"""
+        group_url = reverse('posts:group_list', args=(self.group.slug,))
+        index = self.client.get(reverse('posts:index'))
+        self.assertContains(index, f'href="{group_url}"', count=3)
+        profile_url = reverse('posts:profile', args=(self.author.username,))
+        count, profile = self.rendered(profile_url)
+        self.assertEqual(count, 3)
+        self.assertNotContains(profile, f'href="{group_url}"')
+        self.assertNotContains(profile, f'href="{profile_url}"')
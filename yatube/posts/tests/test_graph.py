@@ -0,0 +1,103 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import graph
+from ..models import Follow
+from .utils import on_commit_hooks
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(6)
+        ]
+        pairs = ((0, 1), (0, 2), (1, 0), (1, 3), (2, 3), (2, 4), (3, 5))
+        for user, author in pairs:
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def pk(self, number):
+        return self.users[number].pk
+
+    def test_adjacency_sorted_and_cached(self):
+        """Массивы подписок отсортированы и читаются из кэша без БД"""
+        self.assertEqual(
+            list(graph.following(self.pk(0))), [self.pk(1), self.pk(2)]
+        )
+        self.assertEqual(
+            list(graph.followers(self.pk(3))), [self.pk(1), self.pk(2)]
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(graph.follower_count(self.pk(3)), 2)
+            self.assertEqual(graph.following_count(self.pk(0)), 2)
+            self.assertTrue(graph.is_following(self.pk(0), self.pk(2)))
+            self.assertFalse(graph.is_following(self.pk(0), self.pk(3)))
+
+    def test_signals_update_cached_arrays(self):
+        """Подписка и отписка меняют закэшированные массивы на месте"""
+        graph.following(self.pk(4))
+        graph.followers(self.pk(0))
+        with on_commit_hooks():
+            Follow.objects.create(user=self.users[4], author=self.users[0])
+            Follow.objects.filter(
+                user=self.users[1], author=self.users[0]
+            ).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(list(graph.following(self.pk(4))), [self.pk(0)])
+            self.assertEqual(list(graph.followers(self.pk(0))), [self.pk(4)])
+
+    def test_stale_load_not_cached(self):
+        """Массив, загруженный до чужой подписки, не остаётся в кэше"""
+        load = graph._load
+
+        def load_then_follow(direction, user_ids):
+            loaded = load(direction, user_ids)
+            with on_commit_hooks():
+                Follow.objects.create(
+                    user=self.users[5], author=self.users[0]
+                )
+            return loaded
+
+        with mock.patch.object(graph, '_load', load_then_follow):
+            self.assertEqual(list(graph.following(self.pk(5))), [])
+        self.assertEqual(list(graph.following(self.pk(5))), [self.pk(0)])
+
+    def test_mutual_follow(self):
+        """Взаимная подписка видна в обе стороны"""
+        self.assertTrue(graph.is_mutual(self.pk(0), self.pk(1)))
+        self.assertTrue(graph.is_mutual(self.pk(1), self.pk(0)))
+        self.assertFalse(graph.is_mutual(self.pk(0), self.pk(2)))
+
+    def test_suggestions_rank_friends_of_friends(self):
+        """Подсказки - друзья друзей по числу общих связей"""
+        self.assertEqual(
+            graph.suggestions(self.pk(0)), [self.pk(3), self.pk(4)]
+        )
+        self.assertEqual(graph.suggestions(self.pk(0), limit=1), [self.pk(3)])
+        with self.assertNumQueries(0):
+            graph.suggestions(self.pk(0))
+        self.assertEqual(graph.suggestions(self.pk(5)), [])
+
+    def test_follow_page_shows_suggestions(self):
+        """Страница подписок предлагает друзей друзей"""
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['suggested'], [self.users[3], self.users[4]]
+        )
+        self.assertContains(
+            response, reverse('posts:profile', args=('user3',))
+        )
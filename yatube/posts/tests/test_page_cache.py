@@ -0,0 +1,113 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from .. import cache as feed_cache
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE=True)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_anonymous_pages_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов к БД"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first['X-Page-Cache'], 'miss')
+                with self.assertNumQueries(0 if url == urls[0] else 1):
+                    second = self.client.get(url)
+                self.assertEqual(second['X-Page-Cache'], 'hit')
+                self.assertEqual(second.content, first.content)
+
+    def test_signals_invalidate_pages(self):
+        """Изменения поста и комментарии сбрасывают его страницы"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий'
+        )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_user_changes_invalidate_only_shown_names(self):
+        """Ленты сбрасывает смена имени автора, но не регистрация и вход"""
+        versions = feed_cache.get_versions(feed_cache.ALL)
+        User.objects.create_user(username='newcomer')
+        self.author.set_password('new-password')
+        self.author.save()
+        self.assertEqual(feed_cache.get_versions(feed_cache.ALL), versions)
+        self.author.last_name = 'Фамилия'
+        self.author.save()
+        self.assertNotEqual(
+            feed_cache.get_versions(feed_cache.ALL), versions
+        )
+
+    def test_not_cached_with_cookies_or_params(self):
+        """Вошедшие, запросы с cookie и с посторонними параметрами мимо кэша"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.assertNotIn('X-Page-Cache', self.client.get(url, {'utm': 'x'}))
+        self.client.cookies['seen'] = '1'
+        self.assertNotIn('X-Page-Cache', self.client.get(url))
+        logged = Client()
+        logged.force_login(self.author)
+        self.assertNotIn('X-Page-Cache', logged.get(url))
+
+    def test_cold_key_rendered_once(self):
+        """Одновременные запросы холодной страницы рисуют её один раз"""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        @feed_cache.page_cache(lambda request: [feed_cache.ALL])
+        def view(request):
+            calls.append(request)
+            started.set()
+            release.wait(5)
+            return HttpResponse('страница')
+
+        factory = RequestFactory()
+        results = []
+
+        def fetch():
+            results.append(view(factory.get('/')))
+
+        first = threading.Thread(target=fetch)
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=fetch)
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(
+            sorted(response['X-Page-Cache'] for response in results),
+            ['hit', 'miss'],
+        )
@@ -0,0 +1,114 @@
+import base64
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..paginators import CursorPaginator, FeedPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.TEST_NUMBER_OF_POST: int = 25
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create([
+            Post(text=f'Тестовый пост {post_num}', author=cls.user)
+            for post_num in range(cls.TEST_NUMBER_OF_POST)
+        ])
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_cursor_pages_cover_all_posts(self):
+        """Курсорные страницы без повторов проходят всю ленту"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        seen = []
+        page = paginator.get_cursor_page()
+        self.assertFalse(page.has_previous())
+        seen.extend(page)
+        while page.has_next():
+            page = paginator.get_cursor_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(
+            [post.id for post in seen],
+            list(
+                Post.objects.order_by('-pub_date', '-id')
+                .values_list('id', flat=True)
+            )
+        )
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_cursor_page()
+        second = paginator.get_cursor_page(first.next_cursor)
+        back = paginator.get_cursor_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_invalid_cursor_opens_first_page(self):
+        """Неверный курсор открывает первую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        self.assertEqual(
+            list(paginator.get_cursor_page('мусор')),
+            list(paginator.get_cursor_page()),
+        )
+
+    def test_out_of_range_cursor_opens_first_page(self):
+        """Курсор с числом вне диапазона БД открывает первую страницу"""
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            [0, '2020-01-01T00:00:00+00:00', 10 ** 30]
+        ).encode()).decode()
+        response = self.client.get(reverse('posts:index'), {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            list(Post.objects.order_by(
+                '-pub_date', '-id'
+            ).values_list('pk', flat=True)[:settings.NUMBER_OF_POSTS]),
+        )
+        response = self.client.get(
+            reverse('posts:api_index'), {'cursor': cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_cursor_page()
+            self.assertTrue(page.has_other_pages())
+
+    def test_approximate_count_is_cached(self):
+        """Приблизительный подсчёт берётся из кэша"""
+        FeedPaginator(Post.objects.all(), 10, approximate_count=True).count
+        Post.objects.create(text='Новый пост', author=self.user)
+        with self.assertNumQueries(0):
+            count = FeedPaginator(
+                Post.objects.all(), 10, approximate_count=True
+            ).count
+        self.assertEqual(count, self.TEST_NUMBER_OF_POST)
+
+    def test_feed_accepts_cursor_parameter(self):
+        """Лента принимает параметр ?cursor="""
+        response = self.client.get(reverse('posts:index') + '?cursor=')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), settings.NUMBER_OF_POSTS)
+        response = self.client.get(
+            reverse('posts:index') + f'?cursor={page_obj.next_cursor}'
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.NUMBER_OF_POSTS
+        )
+        self.assertContains(response, '?cursor=')
@@ -0,0 +1,180 @@
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Размеры страницы ленты. На каждом шаге данных хватает на две
+# страницы, а у поста и автора столько же комментариев и подписчиков.
+SIZES = (2, 5, 10)
+
+# Пространство имён URL -> {имя: (нужен вход, максимум запросов)}.
+# Запросы считаются с пустым кэшем.
+LIMITS = {
+    'posts': {
+        'index': (False, 2),
+        'group_list': (False, 4),
+        'profile': (False, 4),
+        'post_detail': (False, 3),
+        'post_comments': (False, 2),
+        'post_create': (True, 3),
+        'post_edit': (True, 4),
+        'add_comment': (True, 3),
+        'search': (False, 2),
+        'changes': (False, 3),
+        'api_index': (False, 1),
+        'api_group_list': (False, 3),
+        'api_profile': (False, 3),
+        'api_post_detail': (False, 3),
+        'api_follow_index': (True, 5),
+        'api_following': (True, 4),
+        'follow_index': (True, 7),
+        'profile_follow': (True, 14),
+        'profile_unfollow': (True, 11),
+    },
+    'users': {
+        'signup': (False, 0),
+        'logout': (True, 4),
+        'login': (False, 0),
+        'password_change': (True, 2),
+        'password_change_done': (True, 2),
+        'password_reset': (False, 0),
+        'password_reset_done': (False, 0),
+        'password_reset_confirm': (False, 5),
+        'password_reset_complete': (False, 0),
+    },
+    'about': {
+        'author': (False, 0),
+        'tech': (False, 0),
+    },
+}
+
+
+# Эти страницы открывает читатель, подписанный на автора, а не сам
+# автор: у автора подписок нет, и лента подписок была бы пустой.
+# Подписка и отписка - на третьего пользователя, чтобы каждый запрос
+# действительно менял подписку.
+READER_URLS = {
+    'posts:follow_index',
+    'posts:api_follow_index',
+    'posts:api_following',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+}
+
+
+class QueryCountTests(TestCase):
+    """
+    Число запросов каждой страницы не превышает закреплённого
+    и не растёт вместе с объёмом данных.
+    Путь в QUERY_COUNT_REPORT сохраняет отчёт по страницам в JSON.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.target = User.objects.create_user(username='target')
+        Post.objects.create(author=cls.target, text='Пост для подписки')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def grow(self, size):
+        """Доводит объём данных до двух страниц по size записей."""
+        for number in range(Post.objects.count(), size * 2):
+            Post.objects.create(
+                author=self.author,
+                group=self.group,
+                text=f'Пост номер {number}',
+            )
+        self.post = Post.objects.latest('pub_date')
+        for number in range(Comment.objects.count(), size):
+            commenter = User.objects.create_user(username=f'reader{number}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Комментарий {number}'
+            )
+            Follow.objects.create(user=commenter, author=self.author)
+
+    def kwargs(self, name):
+        return {
+            'group_list': {'slug': self.group.slug},
+            'profile': {'username': self.author.username},
+            'post_detail': {'post_id': self.post.pk},
+            'api_group_list': {'slug': self.group.slug},
+            'api_profile': {'username': self.author.username},
+            'api_post_detail': {'post_id': self.post.pk},
+            'post_comments': {'post_id': self.post.pk},
+            'post_edit': {'post_id': self.post.pk},
+            'add_comment': {'post_id': self.post.pk},
+            'profile_follow': {'username': self.target.username},
+            'profile_unfollow': {'username': self.target.username},
+            'password_reset_confirm': {
+                'uidb64': urlsafe_base64_encode(force_bytes(self.author.pk)),
+                'token': default_token_generator.make_token(self.author),
+            },
+        }.get(name, {})
+
+    def count(self, url, user):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url, {'q': 'пост'})
+        self.assertLess(response.status_code, 400, url)
+        return len(captured)
+
+    def test_every_url_is_pinned(self):
+        """Для каждого адреса posts, users и about задан предел"""
+        for namespace, limits in LIMITS.items():
+            patterns = get_resolver().namespace_dict[namespace][1]
+            names = {
+                pattern.name for pattern in patterns.url_patterns
+                if isinstance(pattern, URLPattern)
+            }
+            self.assertEqual(names, set(limits), namespace)
+
+    def test_query_counts(self):
+        """Число запросов не превышает предела и не растёт с данными"""
+        report = {}
+        for size in SIZES:
+            self.grow(size)
+            for namespace, limits in LIMITS.items():
+                for name, (login, limit) in limits.items():
+                    url = reverse(
+                        f'{namespace}:{name}', kwargs=self.kwargs(name)
+                    )
+                    user = None
+                    if login:
+                        user = (
+                            self.reader
+                            if f'{namespace}:{name}' in READER_URLS
+                            else self.author
+                        )
+                    with override_settings(NUMBER_OF_POSTS=size):
+                        queries = self.count(url, user)
+                    counts = report.setdefault(f'{namespace}:{name}', {})
+                    with self.subTest(url=url, size=size):
+                        self.assertLessEqual(queries, limit)
+                        self.assertLessEqual(
+                            queries, min(counts.values(), default=queries),
+                            'Число запросов растёт с размером страницы',
+                        )
+                    counts[size] = queries
+        if os.getenv('QUERY_COUNT_REPORT'):
+            with open(os.getenv('QUERY_COUNT_REPORT'), 'w') as stream:
+                json.dump(report, stream, indent=2)
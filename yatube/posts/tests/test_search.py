@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при сохранении и удалении"""
+        post = Post.objects.create(author=self.user, text='Первый снегопад')
+        self.assertEqual(search.search_post_ids('снегопад'), [post.pk])
+        post.text = 'Весенняя капель'
+        post.save()
+        self.assertEqual(search.search_post_ids('снегопад'), [])
+        self.assertEqual(search.search_post_ids('КАПЕЛ'), [post.pk])
+        post.delete()
+        self.assertEqual(search.search_post_ids('капель'), [])
+
+    def test_comment_finds_post(self):
+        """Пост находится по тексту комментария"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Отличный закат'
+        )
+        self.assertEqual(search.search_post_ids('закат'), [post.pk])
+        self.assertEqual(
+            search.search_ids('закат', search.COMMENT), [comment.pk]
+        )
+        self.assertEqual(search.search_ids('закат', search.POST), [])
+        comment.delete()
+        self.assertEqual(search.search_post_ids('закат'), [])
+
+    def test_results_are_ranked(self):
+        """Более релевантные посты выше"""
+        rare = Post.objects.create(
+            author=self.user, text='Про кошек и немного про собак'
+        )
+        often = Post.objects.create(
+            author=self.user, text='Собаки, собаки и ещё раз собаки'
+        )
+        self.assertEqual(search.search_post_ids('собак'), [often.pk, rare.pk])
+        self.assertEqual(search.search_post_ids('кошек собак'), [rare.pk])
+
+    @override_settings(NUMBER_OF_POSTS=2)
+    def test_search_page_is_paginated(self):
+        """Страница поиска делится на страницы и сохраняет запрос"""
+        for number in range(3):
+            Post.objects.create(author=self.user, text=f'Маяк номер {number}')
+        Post.objects.create(author=self.user, text='Другой текст')
+        response = self.client.get(reverse('posts:search'), {'q': 'маяк'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertContains(response, '?q=%D0%BC%D0%B0%D1%8F%D0%BA&amp;page=2')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'маяк', 'page': 2}
+        )
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertIsInstance(response.context['page_obj'][0], Post)
+
+    def test_admin_uses_index(self):
+        """Поиск в админке идёт по тому же индексу"""
+        post = Post.objects.create(author=self.user, text='Северное сияние')
+        Post.objects.create(author=self.user, text='Южный ветер')
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'сияни'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [post]
+        )
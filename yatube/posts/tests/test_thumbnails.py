@@ -0,0 +1,122 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import thumbnails
+from ..models import Post, ThumbnailTask
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=True)
+class ThumbnailPipelineTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    def test_saving_image_enqueues_task(self):
+        """Пост с картинкой ставит задачу в очередь"""
+        task = ThumbnailTask.objects.get(post=self.post)
+        self.assertEqual(task.status, ThumbnailTask.PENDING)
+        self.assertEqual(task.image, self.post.image.name)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        self.assertEqual(ThumbnailTask.objects.count(), 1)
+
+    def test_feed_shows_original_until_thumbnail_ready(self):
+        """Лента показывает оригинал, пока миниатюра не готова"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.image.url)
+        self.assertEqual(thumbnails.run_pending(), 1)
+        self.assertEqual(
+            ThumbnailTask.objects.get(post=self.post).status,
+            ThumbnailTask.DONE,
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(response, 'width="500"')
+
+    def test_missing_image_fails_task(self):
+        """Задача с потерянным файлом помечается ошибкой"""
+        self.post.image.storage.delete(self.post.image.name)
+        with self.assertLogs(level='ERROR'):
+            for _ in range(settings.THUMBNAIL_MAX_ATTEMPTS):
+                thumbnails.run_pending()
+        task = ThumbnailTask.objects.get(post=self.post)
+        self.assertEqual(task.status, ThumbnailTask.FAILED)
+        self.assertEqual(task.attempts, settings.THUMBNAIL_MAX_ATTEMPTS)
+
+    def test_abandoned_task_claimed_again(self):
+        """Задачу упавшего воркера по таймауту забирает другой"""
+        self.assertEqual(len(thumbnails.claim(10)), 1)
+        self.assertEqual(thumbnails.claim(10), [])
+        ThumbnailTask.objects.update(
+            claimed_at=timezone.now() - timedelta(
+                seconds=settings.THUMBNAIL_CLAIM_TIMEOUT + 1
+            )
+        )
+        with self.assertNumQueries(3):
+            task, = thumbnails.claim(10)
+            self.assertEqual(task.post, self.post)
+        self.assertEqual(task.attempts, 1)
+        ThumbnailTask.objects.update(claimed_at=None)
+        thumbnails.claim(10)
+        ThumbnailTask.objects.update(claimed_at=None)
+        self.assertEqual(thumbnails.claim(10), [])
+        task.refresh_from_db()
+        self.assertEqual(task.status, ThumbnailTask.FAILED)
+        self.assertEqual(task.attempts, settings.THUMBNAIL_MAX_ATTEMPTS)
+
+    def test_page_thumbnails_fetched_in_one_batch(self):
+        """Миниатюры страницы загружаются одним пакетом"""
+        Post.objects.create(
+            author=self.user,
+            text='Второй пост',
+            image=SimpleUploadedFile(
+                name='second.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        thumbnails.run_pending()
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            found = thumbnails.lookup_many(post.image for post in posts)
+        self.assertEqual(len(found), 2)
+        self.assertTrue(all(found.values()))
+        with self.assertNumQueries(0):
+            thumbnails.lookup_many(post.image for post in posts)
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import search, transfer
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=author, group=group, text='Старый пост',
+            image='posts/picture.gif',
+        )
+        self.pub_date = timezone.now() - timedelta(days=30)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(
+            post=self.post, author=reader, text='Комментарий, с "кавычками"'
+        )
+        Follow.objects.create(user=reader, author=author)
+
+    def round_trip(self, name):
+        path = os.path.join(self.tmp_dir, name)
+        call_command('export_yatube', path, stderr=StringIO())
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        out = StringIO()
+        call_command('import_yatube', path, batch_size=1, stdout=out)
+        return out.getvalue()
+
+    def check_restored(self):
+        post = Post.objects.select_related('author', 'group').get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.image.name, 'posts/picture.gif')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            Comment.objects.get().text, 'Комментарий, с "кавычками"'
+        )
+        reader = User.objects.get(username='reader')
+        self.assertTrue(
+            Follow.objects.filter(user=reader, author=post.author).exists()
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=post.author).posts_count, 1
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
+        self.assertEqual(search.search_post_ids('кавычками'), [post.pk])
+
+    def test_jsonl_round_trip(self):
+        """Выгрузка в JSON Lines загружается обратно без потерь"""
+        report = self.round_trip('dump.jsonl')
+        self.assertIn('Загружено 4 записей', report)
+        self.check_restored()
+
+    def test_csv_round_trip(self):
+        """Выгрузка в CSV загружается обратно без потерь"""
+        self.round_trip('dump.csv')
+        self.check_restored()
+
+    def test_repeated_import_skips_existing(self):
+        """Повторная загрузка не создаёт дублей"""
+        path = os.path.join(self.tmp_dir, 'again.jsonl')
+        call_command('export_yatube', path, stderr=StringIO())
+        out = StringIO()
+        call_command('import_yatube', path, stdout=out)
+        self.assertIn('Загружено 0 записей', out.getvalue())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_created_users_get_stats(self):
+        """Пользователи, созданные загрузкой, сразу получают счётчики"""
+        ids = transfer._user_ids(['newcomer', 'author'])
+        self.assertTrue(
+            UserStats.objects.filter(user_id=ids['newcomer']).exists()
+        )
+
+    def test_finish_touches_only_imported(self):
+        """finish() сдвигает id и пересчитывает только загруженное"""
+        outsider = User.objects.create_user(username='outsider')
+        UserStats.objects.filter(user=outsider).update(posts_count=7)
+        path = os.path.join(self.tmp_dir, 'scoped.jsonl')
+        call_command('export_yatube', path, stderr=StringIO())
+        Post.objects.all().delete()
+        with mock.patch.object(
+            connection.ops, 'sequence_reset_sql', return_value=[]
+        ) as reset:
+            call_command('import_yatube', path, stdout=StringIO())
+        reset.assert_called_once_with(mock.ANY, (Post, Comment))
+        self.assertEqual(UserStats.objects.get(user=outsider).posts_count, 7)
+        self.assertEqual(
+            UserStats.objects.get(user__username='author').posts_count, 1
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post_id=self.post.pk
+        ).exists())
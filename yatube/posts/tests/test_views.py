@@ -134,17 +134,32 @@ class PostsViewsTests(TestCase):
         """Проверка кэша для индекса"""
         response = self.authorized_client.get(reverse('posts:index'))
         before_posts = response.content
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_cached.content, before_posts)
         Post.objects.create(
             text='Проверка кэша',
             author=self.post.author,
         )
-        response_another = self.authorized_client.get(reverse('posts:index'))
-        another_post = response_another.content
-        self.assertEqual(another_post, before_posts)
-        cache.clear()
         response_new = self.authorized_client.get(reverse('posts:index'))
-        next_post = response_new.content
-        self.assertNotEqual(another_post, next_post)
+        self.assertNotEqual(response_new.content, before_posts)
+        self.assertContains(response_new, 'Проверка кэша')
+
+    def test_cache_invalidated_on_feed_pages(self):
+        """Изменение поста сразу видно в ленте группы и профиле"""
+        pages: tuple = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for page in pages:
+            self.authorized_client.get(page)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.authorized_client.get(page)
+                self.assertContains(response, 'Отредактированный текст')
 
     def test_subscribe_to_author(self):
         """Проверка подписки на автора пользователем"""
@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def on_commit_hooks(using=DEFAULT_DB_ALIAS):
+    """
+    Выполняет на выходе хуки transaction.on_commit, добавленные внутри
+    блока: в TestCase транзакция теста не коммитится и сами они не
+    срабатывают.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    hooks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, hook in hooks:
+        hook()
@@ -0,0 +1,258 @@
+"""
+Фоновая генерация миниатюр картинок постов.
+
+Сохранение поста с новой картинкой ставит задачу в очередь
+ThumbnailTask, а воркер (команда thumbnail_worker) нарезает миниатюры
+через sorl-thumbnail. Шаблоны только ищут готовую миниатюру в KV-хранилище
+sorl и, пока её нет, показывают оригинал картинки. Задачу, взятую
+упавшим воркером, через THUMBNAIL_CLAIM_TIMEOUT забирает другой.
+"""
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore,
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+
+from . import cache as feed_cache
+from .models import ThumbnailTask
+
+logger = logging.getLogger(__name__)
+
+Placeholder = namedtuple('Placeholder', ('url', 'width', 'height'))
+
+
+class LookupBackend(ThumbnailBackend):
+    """Находит готовую миниатюру, никогда не создавая её."""
+
+    def get_options(self, source, options):
+        """Дополняет опции так же, как ThumbnailBackend.get_thumbnail."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self.get_options(source, options)
+        )
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.get_thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+lookup_backend = LookupBackend()
+
+
+def _get_many_raw(keys):
+    """Сырые значения KV-хранилища sorl одним обращением к кэшу и БД."""
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    metrics.record_cache(hits=len(values), misses=len(missing))
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value')
+        )
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        key: None if value == EMPTY_VALUE else value
+        for key, value in values.items()
+    }
+
+
+def lookup_many(images):
+    """Готовые миниатюры для набора картинок: {имя картинки: миниатюра}."""
+    files = {
+        image.name: lookup_backend.get_thumbnail_file(
+            image,
+            settings.POST_THUMBNAIL_GEOMETRY,
+            **settings.POST_THUMBNAIL_OPTIONS
+        )
+        for image in images if image
+    }
+    keys = {add_prefix(file_.key): name for name, file_ in files.items()}
+    values = _get_many_raw(list(keys)) if keys else {}
+    return {
+        name: deserialize_image_file(values[key]) if values.get(key) else None
+        for key, name in keys.items()
+    }
+
+
+class ThumbnailMap:
+    """
+    Миниатюры картинок страницы ленты.
+    Загружаются одним пакетом при первом обращении из шаблона, поэтому
+    при попадании в кэш фрагмента KV-хранилище не трогается вовсе.
+    """
+
+    def __init__(self, posts):
+        self._posts = posts
+        self._thumbnails = None
+
+    @property
+    def thumbnails(self):
+        if self._thumbnails is None:
+            self._thumbnails = lookup_many(post.image for post in self._posts)
+        return self._thumbnails
+
+    def __contains__(self, name):
+        return name in self.thumbnails
+
+    def __getitem__(self, name):
+        return self.thumbnails[name]
+
+
+def post_thumbnail(image, prefetched=None):
+    """Готовая миниатюра картинки поста или заглушка с оригиналом."""
+    if not image:
+        return None
+    with metrics.timed('thumbnail'):
+        return _post_thumbnail(image, prefetched)
+
+
+def _post_thumbnail(image, prefetched):
+    geometry = settings.POST_THUMBNAIL_GEOMETRY
+    options = settings.POST_THUMBNAIL_OPTIONS
+    if not settings.THUMBNAIL_ASYNC:
+        return default.backend.get_thumbnail(image, geometry, **options)
+    if prefetched is not None and image.name in prefetched:
+        thumbnail = prefetched[image.name]
+    else:
+        thumbnail = lookup_backend.lookup(image, geometry, **options)
+    if thumbnail is not None:
+        return thumbnail
+    width, _, height = geometry.partition('x')
+    return Placeholder(image.url, width, height)
+
+
+def enqueue(post):
+    """Ставит картинку поста в очередь на нарезку миниатюр."""
+    if post.image:
+        ThumbnailTask.objects.create(post=post, image=post.image.name)
+
+
+def claim(limit):
+    """
+    Забирает из очереди задачи, которые не взял другой воркер, и задачи,
+    которые воркер взял больше THUMBNAIL_CLAIM_TIMEOUT назад и бросил.
+    Брошенная задача считается неудачной попыткой.
+    """
+    now = timezone.now()
+    abandoned = Q(status=ThumbnailTask.PROCESSING) & (
+        Q(claimed_at__isnull=True)
+        | Q(claimed_at__lt=now - timedelta(
+            seconds=settings.THUMBNAIL_CLAIM_TIMEOUT
+        ))
+    )
+    ThumbnailTask.objects.filter(
+        abandoned, attempts__gte=settings.THUMBNAIL_MAX_ATTEMPTS - 1
+    ).update(
+        status=ThumbnailTask.FAILED,
+        attempts=F('attempts') + 1,
+        error='Воркер не закончил задачу',
+    )
+    available = Q(status=ThumbnailTask.PENDING) | abandoned
+    claimed = []
+    tasks = ThumbnailTask.objects.filter(available).select_related(
+        'post'
+    ).order_by('created')
+    for task in tasks[:limit]:
+        retry = task.status == ThumbnailTask.PROCESSING
+        changes = {'status': ThumbnailTask.PROCESSING, 'claimed_at': now}
+        if retry:
+            changes['attempts'] = F('attempts') + 1
+        # Условие повторяется в UPDATE: задачу, которую успел взять
+        # другой воркер, оно уже не пропустит.
+        if ThumbnailTask.objects.filter(available, pk=task.pk).update(
+            **changes
+        ):
+            task.status = ThumbnailTask.PROCESSING
+            task.claimed_at = now
+            task.attempts += retry
+            claimed.append(task)
+    return claimed
+
+
+def process(task):
+    """Нарезает миниатюры для одной задачи."""
+    try:
+        image = task.post.image
+        if image.name != task.image:
+            task.status = ThumbnailTask.DONE
+        else:
+            thumbnail = default.backend.get_thumbnail(
+                image,
+                settings.POST_THUMBNAIL_GEOMETRY,
+                **settings.POST_THUMBNAIL_OPTIONS
+            )
+            if default.kvstore.get(thumbnail) is None:
+                raise ValueError(f'Не удалось создать миниатюру {image.name}')
+            task.status = ThumbnailTask.DONE
+            feed_cache.bump(
+                feed_cache.post_scope(task.post_id),
+                *feed_cache.post_scopes(
+                    task.post.author_id, task.post.group_id
+                ),
+            )
+    except Exception as error:
+        logger.exception('Thumbnail task %s failed', task.pk)
+        task.attempts += 1
+        task.error = str(error)
+        task.status = (
+            ThumbnailTask.FAILED
+            if task.attempts >= settings.THUMBNAIL_MAX_ATTEMPTS
+            else ThumbnailTask.PENDING
+        )
+    task.save(update_fields=('status', 'attempts', 'error'))
+    return task
+
+
+def _process_in_thread(task):
+    try:
+        return process(task)
+    finally:
+        connection.close()
+
+
+def run_pending(threads=1, batch_size=None):
+    """Обрабатывает пачку задач. Возвращает количество обработанных."""
+    tasks = claim(batch_size or settings.THUMBNAIL_BATCH_SIZE)
+    if threads > 1 and len(tasks) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(_process_in_thread, tasks))
+    else:
+        for task in tasks:
+            process(task)
+    return len(tasks)
@@ -0,0 +1,237 @@
+"""
+Материализованная лента подписок.
+
+Новый пост сразу раскладывается по лентам подписчиков автора
+(fan-out on write), поэтому страница подписок читает одну таблицу
+TimelineEntry вместо соединения Post -> User -> Follow. Запись ленты
+хранит дату поста, и индекс (user, -pub_date, -post) отдаёт страницу
+ленты без сортировки.
+
+Посты авторов, у которых больше TIMELINE_FANOUT_LIMIT подписчиков,
+не раскладываются: лента добирает их при чтении (fan-out on read).
+С какого момента это началось, помнит UserStats.fanout_skipped_since.
+Когда автор опускается ниже предела, его посты с этого момента
+докладывает в ленты backfill() из команды rebuild_timelines, а до тех
+пор лента по-прежнему добирает их при чтении.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.cache import Namespace
+from . import graph
+from .models import Follow, Post, TimelineEntry, UserStats
+
+timeline_cache = Namespace('timeline')
+
+# Порядок ленты подписок: по полям записи ленты, чтобы страницу
+# отдавал индекс, а не сортировка.
+FEED_ORDERING = ('-feed_date', '-feed_post_id')
+
+
+def celebrities(refresh=False):
+    """
+    Авторы, чьи посты читаются из ленты при запросе:
+    {id автора: с какого момента его посты не раскладываются}.
+    """
+    if not refresh:
+        found = timeline_cache.get('celebrities-since')
+        if found is not None:
+            return found
+    rows = UserStats.objects.filter(
+        Q(followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+        | Q(fanout_skipped_since__isnull=False)
+    ).values_list('user_id', 'fanout_skipped_since')
+    now = timezone.now()
+    found = {user_id: since or now for user_id, since in rows}
+    promoted = [user_id for user_id, since in rows if since is None]
+    if promoted:
+        UserStats.objects.filter(
+            user_id__in=promoted, fanout_skipped_since__isnull=True
+        ).update(fanout_skipped_since=now)
+    timeline_cache.set(
+        'celebrities-since', found, settings.TIMELINE_CELEBRITIES_TIMEOUT
+    )
+    return found
+
+
+def celebrity_ids(refresh=False):
+    """Авторы, чьи посты читаются из ленты при запросе."""
+    return frozenset(celebrities(refresh))
+
+
+def _in_timelines(skipped):
+    """Условие на посты, которые лежат в лентах; skipped - celebrities()."""
+    if not skipped:
+        return Q()
+    condition = ~Q(author_id__in=list(skipped))
+    for author_id, since in skipped.items():
+        condition |= Q(author_id=author_id, pub_date__lt=since)
+    return condition
+
+
+def _bulk_add(entries, batch_size=None):
+    entries = list(entries)
+    # Django 2.2 не урезает явный batch_size до лимитов СУБД.
+    batch_size = min(
+        batch_size or settings.TIMELINE_BATCH_SIZE,
+        connection.ops.bulk_batch_size(
+            TimelineEntry._meta.concrete_fields, entries
+        ),
+    )
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=max(batch_size, 1),
+        ignore_conflicts=True,
+    )
+
+
+def _add_posts(user_ids, posts, batch_size):
+    """
+    Кладёт посты (values_list('id', 'pub_date')) в ленты user_ids
+    пачками. Возвращает количество записей.
+    """
+    entries = 0
+    batch = []
+    for post_id, pub_date in posts.iterator(chunk_size=batch_size):
+        batch.extend(
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id in user_ids
+        )
+        if len(batch) >= batch_size:
+            _bulk_add(batch, batch_size)
+            entries += len(batch)
+            batch = []
+    _bulk_add(batch, batch_size)
+    return entries + len(batch)
+
+
+def _posts_since(author_id, since):
+    return Post.objects.filter(
+        author_id=author_id, pub_date__gte=since
+    ).values_list('id', 'pub_date')
+
+
+def backfill(batch_size=None):
+    """
+    Докладывает в ленты подписчиков посты авторов, которые перестали
+    быть популярными, начиная с fanout_skipped_since.
+    Возвращает количество авторов и добавленных записей.
+    """
+    batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    pending = list(UserStats.objects.filter(
+        fanout_skipped_since__isnull=False, followers_count__lte=limit
+    ).values_list('user_id', 'fanout_skipped_since'))
+    entries = 0
+    for author_id, since in pending:
+        follower_ids = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        started = timezone.now()
+        entries += _add_posts(
+            follower_ids, _posts_since(author_id, since), batch_size
+        )
+        UserStats.objects.filter(
+            user_id=author_id, followers_count__lte=limit
+        ).update(fanout_skipped_since=None)
+        celebrities(refresh=True)
+        # Посты, опубликованные, пока воркеры ещё считали автора
+        # популярным, докладываются вторым проходом.
+        entries += _add_posts(
+            follower_ids, _posts_since(author_id, started), batch_size
+        )
+    return len(pending), entries
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def add_author(user_id, author_id):
+    """Переносит в ленту посты автора, на которого подписался читатель."""
+    add_authors(user_id, [author_id])
+
+
+def add_authors(user_id, author_ids):
+    """
+    Переносит в ленту посты нескольких авторов одной вставкой. У
+    популярных авторов - только посты, разложенные до их популярности.
+    """
+    author_ids = set(author_ids)
+    if not author_ids:
+        return
+    skipped = {
+        author_id: since for author_id, since in celebrities().items()
+        if author_id in author_ids
+    }
+    posts = Post.objects.filter(
+        _in_timelines(skipped), author_id__in=author_ids
+    ).values_list('id', 'pub_date')
+    _add_posts([user_id], posts, settings.TIMELINE_BATCH_SIZE)
+
+
+def remove_author(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    remove_authors(user_id, [author_id])
+
+
+def remove_authors(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id__in=author_ids
+    ).delete()
+
+
+def feed(user):
+    """
+    Посты ленты подписок пользователя в порядке FEED_ORDERING. Если
+    читатель не подписан на популярных авторов, страница читается по
+    индексу записей ленты.
+    """
+    followed = celebrity_ids().intersection(graph.following(user.pk))
+    if followed:
+        posts = Post.objects.filter(
+            Q(id__in=TimelineEntry.objects.filter(
+                user=user
+            ).values('post_id'))
+            | Q(author_id__in=followed)
+        ).annotate(feed_date=F('pub_date'), feed_post_id=F('id'))
+    else:
+        posts = Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post_id=F('timeline_entries__post_id'),
+        )
+    return posts.select_related('author', 'group').order_by(*FEED_ORDERING)
+
+
+def rebuild(user_ids=None, batch_size=None):
+    """
+    Пересобирает ленты пользователей с нуля.
+    Возвращает количество пользователей и записанных записей ленты.
+    """
+    batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+    condition = _in_timelines(celebrities(refresh=True))
+    if user_ids is None:
+        user_ids = Follow.objects.values_list(
+            'user_id', flat=True
+        ).distinct().order_by('user_id')
+        TimelineEntry.objects.exclude(user_id__in=user_ids).delete()
+    users = entries = 0
+    for user_id in user_ids:
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        posts = Post.objects.filter(
+            condition, author__following__user_id=user_id
+        ).values_list('id', 'pub_date')
+        entries += _add_posts([user_id], posts, batch_size)
+        users += 1
+    return users, entries
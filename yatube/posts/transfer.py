@@ -0,0 +1,384 @@
+"""
+Потоковые выгрузка и загрузка данных блога.
+
+Записи групп, постов, комментариев и подписок идут одним потоком
+в формате JSON Lines или CSV, в порядке зависимостей: сначала группы,
+потом посты, комментарии и подписки. Пользователи и группы указываются
+по username и slug, посты и комментарии сохраняют свои id. Картинки
+переносятся только как имена файлов в хранилище.
+
+Загрузка идёт пачками через bulk_create и не вызывает сигналы моделей:
+поисковый индекс и очередь миниатюр пополняются по пачкам, а счётчики,
+ленты подписок и кэш лент восстанавливает finish() после загрузки.
+Он же сдвигает последовательности id: bulk_create с явными id их
+не трогает, и следующий пост на PostgreSQL получил бы занятый id.
+"""
+import csv
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache as feed_cache
+from . import counters, graph, search, timeline
+from .models import Comment, Follow, Group, Post, ThumbnailTask, User
+
+GROUP = 'group'
+POST = 'post'
+COMMENT = 'comment'
+FOLLOW = 'follow'
+MODELS = (GROUP, POST, COMMENT, FOLLOW)
+
+# Поле записи: путь для values() при выгрузке.
+FIELDS = {
+    GROUP: {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    },
+    POST: {
+        'id': 'id',
+        'author': 'author__username',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'group': 'group__slug',
+        'image': 'image',
+    },
+    COMMENT: {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    FOLLOW: {
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+}
+
+COLUMNS = ['model'] + list(dict.fromkeys(
+    field for fields in FIELDS.values() for field in fields
+))
+
+QUERYSETS = {
+    GROUP: lambda: Group.objects.order_by('pk'),
+    POST: lambda: Post.objects.order_by('pk'),
+    COMMENT: lambda: Comment.objects.order_by('pk'),
+    FOLLOW: lambda: Follow.objects.order_by('pk'),
+}
+
+
+class JSONLinesFormat:
+    def writer(self, stream):
+        def write(record):
+            # default=str сохраняет даты с микросекундами, как и в CSV.
+            stream.write(
+                json.dumps(record, default=str, ensure_ascii=False) + '\n'
+            )
+        return write
+
+    def reader(self, stream):
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+class CSVFormat:
+    """Одна таблица на все модели: лишние для модели колонки пусты."""
+
+    def writer(self, stream):
+        writer = csv.DictWriter(stream, COLUMNS)
+        writer.writeheader()
+        return writer.writerow
+
+    def reader(self, stream):
+        for row in csv.DictReader(stream):
+            yield {
+                field: row[field]
+                for field in ('model', *FIELDS[row['model']])
+            }
+
+
+FORMATS = {
+    'jsonl': JSONLinesFormat,
+    'csv': CSVFormat,
+}
+
+
+def export(stream, format='jsonl', models=MODELS, chunk_size=2000):
+    """
+    Выгружает модели в поток, читая БД кусками по chunk_size строк.
+    Возвращает количество записей по моделям.
+    """
+    write = FORMATS[format]().writer(stream)
+    exported = Counter()
+    for model in MODELS:
+        if model not in models:
+            continue
+        fields = FIELDS[model]
+        rows = QUERYSETS[model]().values_list(*fields.values())
+        for row in rows.iterator(chunk_size=chunk_size):
+            write({'model': model, **dict(zip(fields, row))})
+            exported[model] += 1
+    return exported
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Не даёт auto_now_add перезаписать даты из выгрузки."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _empty(value):
+    return None if value in (None, '') else value
+
+
+def _date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def _new_ids(model, records):
+    """id записей, которых ещё нет в таблице модели."""
+    ids = {int(record['id']) for record in records}
+    return ids - set(
+        model.objects.filter(pk__in=ids).values_list('pk', flat=True)
+    )
+
+
+def _user_ids(usernames):
+    """id пользователей по username, недостающие создаются без пароля."""
+    usernames = set(usernames)
+    found = dict(
+        User.objects.filter(
+            username__in=usernames
+        ).values_list('username', 'pk')
+    )
+    missing = usernames - set(found)
+    if missing:
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in missing],
+            ignore_conflicts=True,
+        )
+        created = dict(
+            User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk')
+        )
+        counters.create_user_stats(created.values())
+        found.update(created)
+    return found
+
+
+class Importer:
+    """
+    Копит записи по моделям и сохраняет их пачками по batch_size,
+    каждую пачку - в своей транзакции. Перед пачкой модели сохраняются
+    накопленные записи моделей, от которых она зависит.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.pending = {model: [] for model in MODELS}
+        self.imported = Counter()
+        self.skipped = Counter()
+        # Кого коснулась загрузка: finish() пересчитывает только их.
+        self.user_ids = set()
+        self.author_ids = set()
+        self.post_ids = set()
+        self.follower_ids = set()
+
+    def add(self, record):
+        model = record['model']
+        if model not in self.pending:
+            raise ValueError(f'Неизвестная модель: {model}')
+        self.pending[model].append(record)
+        if len(self.pending[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, upto=FOLLOW):
+        for model in MODELS[:MODELS.index(upto) + 1]:
+            records = self.pending[model]
+            if records:
+                self.pending[model] = []
+                with transaction.atomic():
+                    saved = getattr(self, f'save_{model}s')(records)
+                self.imported[model] += saved
+                self.skipped[model] += len(records) - saved
+
+    def save_groups(self, records):
+        existing = set(
+            Group.objects.filter(
+                slug__in={record['slug'] for record in records}
+            ).values_list('slug', flat=True)
+        )
+        records = [
+            record for record in records if record['slug'] not in existing
+        ]
+        Group.objects.bulk_create(
+            [
+                Group(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record['description'] or '',
+                )
+                for record in records
+            ],
+        )
+        return len(records)
+
+    def save_posts(self, records):
+        new_ids = _new_ids(Post, records)
+        records = [
+            record for record in records if int(record['id']) in new_ids
+        ]
+        users = _user_ids(record['author'] for record in records)
+        groups = dict(
+            Group.objects.filter(
+                slug__in={record['group'] for record in records}
+            ).values_list('slug', 'pk')
+        )
+        posts = [
+            Post(
+                id=int(record['id']),
+                author_id=users[record['author']],
+                text=record['text'],
+                pub_date=_date(record.get('pub_date')),
+                group_id=groups.get(_empty(record.get('group'))),
+                image=_empty(record.get('image')) or '',
+            )
+            for record in records
+        ]
+        with keep_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create(posts)
+        self.author_ids.update(post.author_id for post in posts)
+        self.user_ids.update(self.author_ids)
+        self.post_ids.update(post.pk for post in posts)
+        ThumbnailTask.objects.bulk_create(
+            ThumbnailTask(post_id=post.pk, image=post.image.name)
+            for post in posts if post.image
+        )
+        search.index_objects(search.POST, posts)
+        return len(posts)
+
+    def save_comments(self, records):
+        new_ids = _new_ids(Comment, records)
+        post_ids = set(
+            Post.objects.filter(
+                pk__in={int(record['post']) for record in records}
+            ).values_list('pk', flat=True)
+        )
+        records = [
+            record for record in records
+            if int(record['id']) in new_ids and int(record['post']) in post_ids
+        ]
+        users = _user_ids(record['author'] for record in records)
+        comments = [
+            Comment(
+                id=int(record['id']),
+                post_id=int(record['post']),
+                author_id=users[record['author']],
+                text=record['text'],
+                created=_date(record.get('created')),
+            )
+            for record in records
+        ]
+        with keep_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments)
+        self.post_ids.update(comment.post_id for comment in comments)
+        search.index_objects(search.COMMENT, comments)
+        return len(comments)
+
+    def save_follows(self, records):
+        records = [
+            record for record in records if record['user'] != record['author']
+        ]
+        users = _user_ids(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        pairs = {
+            (users[record['user']], users[record['author']])
+            for record in records
+        }
+        pairs -= set(
+            Follow.objects.filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                author_id__in={author_id for _, author_id in pairs},
+            ).values_list('user_id', 'author_id')
+        )
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        )
+        for user_id, author_id in pairs:
+            self.user_ids.update((user_id, author_id))
+            self.follower_ids.add(user_id)
+        return len(pairs)
+
+
+def load(stream, format='jsonl', batch_size=1000):
+    """Загружает записи из потока. Возвращает Importer со статистикой."""
+    importer = Importer(batch_size)
+    for record in FORMATS[format]().reader(stream):
+        importer.add(record)
+    importer.flush()
+    return importer
+
+
+def throughput(counts, elapsed):
+    """Строка отчёта: сколько записей каких моделей и с какой скоростью."""
+    total = sum(counts.values())
+    details = ', '.join(
+        f'{model}: {counts[model]}' for model in MODELS if counts[model]
+    )
+    return (
+        f'{total} записей ({details or "нет записей"}) '
+        f'за {elapsed:.2f} с, {total / max(elapsed, 1e-6):.0f} записей/с'
+    )
+
+
+def reset_sequences(models=(Post, Comment)):
+    """Сдвигает последовательности id за максимальный id таблиц."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def finish(importer=None):
+    """
+    Восстанавливает то, что при загрузке обновили бы сигналы. С importer
+    пересчитываются только загруженные им пользователи, посты и ленты,
+    без него - все.
+    """
+    reset_sequences()
+    if importer is None:
+        counters.recount_users()
+        counters.recount_posts()
+        timeline.rebuild()
+    else:
+        counters.recount_users(importer.user_ids)
+        counters.recount_posts(importer.post_ids)
+        # Новые посты нужны в лентах всех подписчиков их авторов.
+        follower_ids = importer.follower_ids | set(
+            Follow.objects.filter(
+                author_id__in=importer.author_ids
+            ).values_list('user_id', flat=True)
+        )
+        timeline.rebuild(sorted(follower_ids))
+    feed_cache.versions.invalidate()
+    graph.graph_cache.invalidate()
@@ -1,27 +1,100 @@
 from django.conf import settings
-from django.shortcuts import get_object_or_404, render, redirect
 from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils.http import urlencode
+
+from core.db.routers import read_replica
 
-from .models import Group, Post, Follow, User
+from .models import Comment, Group, Post, User
 from .forms import PostForm, CommentForm
+from . import cache as feed_cache
+from . import changes as change_feed
+from . import follows, graph
+from . import search as search_index
+from . import thumbnails, timeline
+from .paginators import CursorPaginator, FeedPaginator
 
 
-def paginations(page_number, page_list):
-    paginator = Paginator(page_list, settings.NUMBER_OF_POSTS)
+def paginations(page_number, page_list, ordering=None):
+    cursor = page_number.GET.get('cursor')
+    if cursor is not None or settings.FEED_PAGINATION == 'cursor':
+        paginator = CursorPaginator(
+            page_list,
+            settings.NUMBER_OF_POSTS,
+            ordering=ordering,
+            approximate_count=settings.PAGINATOR_APPROXIMATE_COUNT,
+        )
+        return paginator.get_cursor_page(cursor)
+    paginator = FeedPaginator(
+        page_list,
+        settings.NUMBER_OF_POSTS,
+        approximate_count=settings.PAGINATOR_APPROXIMATE_COUNT,
+    )
     return paginator.get_page(page_number.GET.get('page'))
 
 
+def index_scopes(request):
+    if request.user.is_authenticated:
+        # Кнопки подписки у авторов зависят от подписок читателя.
+        return [feed_cache.ALL, feed_cache.follow_scope(request.user.pk)]
+    return [feed_cache.ALL]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('pk', flat=True).first()
+    if group_id is None:
+        return None
+    return [feed_cache.group_scope(group_id), feed_cache.USERS]
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if author_id is None:
+        return None
+    return [
+        feed_cache.author_scope(author_id),
+        feed_cache.follow_scope(author_id),
+        feed_cache.followers_scope(author_id),
+        feed_cache.follow_scope(request.user.pk),
+    ]
+
+
+def post_scopes(request, post_id):
+    post = Post.objects.filter(
+        pk=post_id
+    ).values('author_id', 'group_id').first()
+    if post is None:
+        return None
+    scopes = [feed_cache.author_scope(post['author_id']), feed_cache.USERS]
+    if post['group_id']:
+        scopes.append(feed_cache.group_scope(post['group_id']))
+    return scopes
+
+
+@read_replica
+@feed_cache.conditional(index_scopes)
+@feed_cache.page_cache(index_scopes)
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
     page_obj = paginations(page_number=request, page_list=post_list)
     context = {
         'page_obj': page_obj,
+        'thumbnails': thumbnails.ThumbnailMap(page_obj),
         'show_group_link': True,
+        'follows': follows.for_request(request),
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_replica
+@feed_cache.conditional(group_scopes)
+@feed_cache.page_cache(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     group_list = group.posts.select_related('author')
@@ -29,44 +102,70 @@ def group_posts(request, slug):
     context = {
         'group': group,
         'page_obj': page_obj,
+        'thumbnails': thumbnails.ThumbnailMap(page_obj),
+        **feed_cache.fragment_context(
+            feed_cache.group_scope(group.pk), feed_cache.USERS
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_replica
+@feed_cache.conditional(profile_scopes)
+@feed_cache.page_cache(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     author_posts = author.posts.select_related('group')
     page_obj = paginations(page_number=request, page_list=author_posts)
-    following = (
-        request.user.is_authenticated
-        and author.following.filter(
-            user=request.user
-        )
-    )
+    following = follows.for_request(request).is_following(author)
     context = {
         'author': author,
         'page_obj': page_obj,
+        'thumbnails': thumbnails.ThumbnailMap(page_obj),
         'following': following,
+        **feed_cache.fragment_context(feed_cache.author_scope(author.pk)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comments_page(request, post_id):
+    """Порция комментариев поста после курсора ?cursor= по (created, id)."""
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+@read_replica
+@feed_cache.conditional(post_scopes)
+@feed_cache.page_cache(post_scopes)
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
+        Post.objects.select_related('author__stats', 'group'),
         id=post_id
     )
-    comments = post.comments.select_related(
-        'author'
-    )
     context = {
         'post': post,
         'form': CommentForm(),
-        'comments': comments,
+        'comments': comments_page(request, post.id),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@read_replica
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post.id),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -96,7 +195,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        form.save(commit=False).save(
+            update_fields=(*PostForm.Meta.fields, 'updated_at')
+        )
         return redirect('posts:post_detail', post_id=post.id)
     context = {
         'form': form,
@@ -117,26 +218,73 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    post_ids = search_index.search_post_ids(query) if query else []
+    page_obj = Paginator(post_ids, settings.NUMBER_OF_POSTS).get_page(
+        request.GET.get('page')
+    )
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        page_obj.object_list
+    )
+    page_obj.object_list = [
+        posts[pk] for pk in page_obj.object_list if pk in posts
+    ]
+    context = {
+        'query': query,
+        'page_prefix': urlencode({'q': query}) + '&',
+        'page_obj': page_obj,
+        'thumbnails': thumbnails.ThumbnailMap(page_obj),
+        'show_group_link': True,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def changes(request):
+    """Изменения постов и комментариев после ?since= (курсор или время)."""
+    try:
+        limit = request.GET.get('limit')
+        result = change_feed.changes(
+            request.GET.get('since'), int(limit) if limit else None
+        )
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(result, json_dumps_params={'ensure_ascii': False})
+
+
+def suggested_authors(user):
+    """Кого предложить в подписки, в порядке подсказок графа."""
+    ids = graph.suggestions(user.pk)
+    authors = User.objects.in_bulk(ids)
+    return [authors[pk] for pk in ids if pk in authors]
+
+
 @login_required
+@read_replica
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
-    page_obj = paginations(page_number=request, page_list=post_list)
-    context = {'page_obj': page_obj}
+    post_list = timeline.feed(request.user)
+    page_obj = paginations(
+        page_number=request, page_list=post_list,
+        ordering=timeline.FEED_ORDERING,
+    )
+    context = {
+        'page_obj': page_obj,
+        'thumbnails': thumbnails.ThumbnailMap(page_obj),
+        'follows': follows.for_request(request),
+        'suggested': suggested_authors(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    follows.follow_many(request.user.pk, [author.pk])
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    follows.unfollow_many(request.user.pk, [author.pk])
     return redirect('posts:profile', username=username)
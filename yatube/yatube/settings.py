@@ -1,5 +1,19 @@
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
+
+def env_choice(variable, choices, default):
+    """Значение переменной окружения, которое должно быть ключом choices."""
+    value = os.getenv(variable, default)
+    if value not in choices:
+        raise ImproperlyConfigured(
+            f'{variable}={value!r}, допустимые значения: '
+            f'{", ".join(choices)}'
+        )
+    return value
+
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -39,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
+    'core.db.routers.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,11 +66,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Вне режима отладки (или с TEMPLATE_CACHE=1) скомпилированные шаблоны
+# кэшируются на всё время жизни процесса, а wsgi.py при запуске
+# заранее загружает их все (core.templates.warm_up).
+TEMPLATE_CACHE: bool = bool(int(os.getenv('TEMPLATE_CACHE', not DEBUG)))
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -63,6 +88,10 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
             ],
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATE_CACHE else TEMPLATE_LOADERS
+            ),
         },
     },
 ]
@@ -73,13 +102,84 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# СУБД выбирается переменной окружения DB_ENGINE. Соединения живут
+# DB_CONN_MAX_AGE секунд и переиспользуются между запросами; у пула
+# PostgreSQL соединение возвращается в пул, поэтому там 0.
+DATABASE_ENGINES = {
+    'sqlite': 'core.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'postgresql_pool': 'core.db.backends.postgresql_pool',
+}
+
+DATABASE_NAMES = {
+    'sqlite': os.path.join(BASE_DIR, 'db.sqlite3'),
+    'postgresql': 'yatube',
+    'postgresql_pool': 'yatube',
+}
+
+DATABASE_ENGINE = env_choice('DB_ENGINE', DATABASE_ENGINES, 'sqlite')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение - размер в КиБ, а не в страницах.
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 64 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+}
+
+DATABASE_OPTIONS = {
+    'sqlite': {'pragmas': SQLITE_PRAGMAS},
+    'postgresql': {},
+    'postgresql_pool': {
+        'min_connections': int(os.getenv('DB_POOL_MIN', 1)),
+        'max_connections': int(os.getenv('DB_POOL_MAX', 10)),
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'ENGINE': DATABASE_ENGINES[DATABASE_ENGINE],
+        'NAME': os.getenv('DB_NAME', DATABASE_NAMES[DATABASE_ENGINE]),
+        'USER': os.getenv('DB_USER', ''),
+        'PASSWORD': os.getenv('DB_PASSWORD', ''),
+        'HOST': os.getenv('DB_HOST', ''),
+        'PORT': os.getenv('DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_CONN_MAX_AGE',
+            0 if DATABASE_ENGINE == 'postgresql_pool' else 60,
+        )),
+        'OPTIONS': DATABASE_OPTIONS[DATABASE_ENGINE],
     }
 }
 
+# Реплики для чтения лент: DB_REPLICAS="адрес[=вес],..." - файлы SQLite
+# или хосты PostgreSQL, остальные параметры берутся у default.
+# Реплика выбирается по кругу (round_robin) или по весам (weighted).
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', '').split(','))
+):
+    address, _, weight = replica.partition('=')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME' if DATABASE_ENGINE == 'sqlite' else 'HOST': address,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[f'replica_{number}'] = int(weight or 1)
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+
+REPLICA_SELECTIONS = ('round_robin', 'weighted')
+
+REPLICA_SELECTION = env_choice(
+    'DB_REPLICA_SELECTION', REPLICA_SELECTIONS, 'round_robin'
+)
+
+# Сколько секунд после своей записи пользователь читает из default.
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'pin_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -127,6 +227,50 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 NUMBER_OF_POSTS: int = 10
 
+# Комментарии под постом подгружаются порциями по столько штук.
+COMMENTS_PER_PAGE: int = 20
+
+# Лента изменений /changes/: записей на запрос и задержка в секундах,
+# за которую успевают зафиксироваться начатые транзакции.
+CHANGES_PAGE_SIZE: int = 100
+CHANGES_MAX_PAGE_SIZE: int = 1000
+CHANGES_DELAY: int = 1
+
+# 'page' - навигация по номерам страниц, 'cursor' - курсорная пагинация.
+FEED_PAGINATION: str = os.getenv('FEED_PAGINATION', 'page')
+
+PAGINATOR_APPROXIMATE_COUNT: bool = bool(
+    int(os.getenv('PAGINATOR_APPROXIMATE_COUNT', 0))
+)
+
+PAGINATOR_COUNT_TIMEOUT: int = 60
+
+# Посты авторов с большим числом подписчиков не раскладываются
+# по лентам при публикации, а добираются при чтении ленты.
+TIMELINE_FANOUT_LIMIT: int = 1000
+
+TIMELINE_CELEBRITIES_TIMEOUT: int = 300
+
+TIMELINE_BATCH_SIZE: int = 1000
+
+# Массивы подписок posts.graph живут в кэше сутки: сигналы Follow
+# дополняют их на месте, срок ограничивает расхождение после сбоев.
+GRAPH_CACHE_TIMEOUT: int = 24 * 60 * 60
+
+GRAPH_LOCK_TIMEOUT: float = 1
+
+GRAPH_LOCK_POLL_INTERVAL: float = 0.01
+
+# Сколько авторов предлагать в подписки и по скольким подпискам
+# пользователя искать кандидатов.
+GRAPH_SUGGESTIONS: int = 5
+
+GRAPH_SUGGESTION_SOURCES: int = 200
+
+# Сколько авторов можно подписать и отписать одним запросом
+# к api/following/.
+FOLLOW_BATCH_LIMIT: int = 100
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -136,8 +280,102 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Миниатюры картинок постов нарезает воркер thumbnail_worker,
+# до этого в лентах показывается оригинал картинки.
+THUMBNAIL_ASYNC: bool = bool(int(os.getenv('THUMBNAIL_ASYNC', 1)))
+
+POST_THUMBNAIL_GEOMETRY: str = '500x500'
+
+POST_THUMBNAIL_OPTIONS: dict = {'crop': 'center', 'upscale': True}
+
+THUMBNAIL_BATCH_SIZE: int = 20
+
+THUMBNAIL_MAX_ATTEMPTS: int = 3
+
+# Задачу, которую воркер не закончил за это время (в секундах),
+# забирает другой воркер: первый, видимо, упал.
+THUMBNAIL_CLAIM_TIMEOUT: int = 600
+
+# Конфигурация словаря to_tsvector для поиска на PostgreSQL.
+SEARCH_CONFIG: str = 'russian'
+
+# Поиск возвращает не больше стольких лучших постов.
+SEARCH_MAX_RESULTS: int = 1000
+
+# Метрики запросов: заголовок Server-Timing и строки JSON в логгере
+# core.metrics (уровень INFO). По умолчанию включены в режиме отладки.
+REQUEST_METRICS: bool = bool(int(os.getenv('REQUEST_METRICS', DEBUG)))
+
+# Сколько одинаковых по форме SQL-запросов за запрос считать N+1.
+METRICS_REPEATED_QUERY_THRESHOLD: int = 5
+
+# Время отрисовки каждого шаблона, включая {% include %}, в строке
+# метрик запроса: сколько самых дорогих шаблонов показывать.
+TEMPLATE_PROFILE: bool = bool(int(os.getenv('TEMPLATE_PROFILE', 0)))
+TEMPLATE_PROFILE_TOP: int = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['console'],
+            'level': os.getenv('METRICS_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
+# Фрагменты лент сбрасываются сигналами моделей, поэтому по умолчанию
+# хранятся бессрочно (None).
+FEED_CACHE_TIMEOUT = None
+
+# Целые страницы лент и постов для анонимных запросов без cookie.
+# По умолчанию включён вне режима отладки: в отладке и тестах страницы
+# должны отрисовываться. Ключ включает версии лент, так что срок жизни
+# нужен только, чтобы кэш не копил старые страницы. Запросы к ещё
+# не отрисованной странице ждут её до PAGE_CACHE_WAIT секунд.
+PAGE_CACHE: bool = bool(int(os.getenv('PAGE_CACHE', not DEBUG)))
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 600))
+PAGE_CACHE_PARAMS = {'page', 'cursor'}
+PAGE_CACHE_WAIT = 5
+PAGE_CACHE_POLL_INTERVAL = 0.05
+PAGE_CACHE_LOCK_TIMEOUT = 10
+
+# Фрагменты, отрисованные по данным реплики, могут быть старше версии
+# в ключе, поэтому живут недолго.
+REPLICA_CACHE_TIMEOUT = REPLICA_PIN_SECONDS
+
+# Кэш выбирается переменной окружения CACHE_BACKEND. Несколько воркеров
+# должны работать с общим кэшем (redis, memcached, file или sqlite),
+# иначе сброс кэша в одном процессе не дойдёт до остальных.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.backends.SQLiteCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+CACHE_LOCATIONS = {
+    'locmem': '',
+    'file': os.path.join(BASE_DIR, 'cache'),
+    'sqlite': os.path.join(BASE_DIR, 'cache.sqlite3'),
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+CACHE_BACKEND = env_choice('CACHE_BACKEND', CACHE_BACKENDS, 'locmem')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', CACHE_LOCATIONS[CACHE_BACKEND]
+        ),
+        'KEY_PREFIX': os.getenv('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(os.getenv('CACHE_VERSION', 1)),
     }
 }